@@ -0,0 +1,126 @@
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EnergyGate:
+    """
+    Cheap RMS energy gate with hysteresis for dropping silent audio before transcription.
+
+    The gate opens when a chunk's level reaches open_threshold_db and stays open while the
+    level stays above the lower close_threshold_db. After the level falls below that, it
+    stays open for hangover_seconds more so trailing words are not cut off.
+    """
+    def __init__(self, open_threshold_db=-50.0, close_threshold_db=-60.0, hangover_seconds=1.0,
+                 report_every=20):
+        self.open_threshold_db = open_threshold_db
+        self.close_threshold_db = close_threshold_db
+        self.hangover_seconds = hangover_seconds
+        self.report_every = report_every  # Log the counters after this many skipped chunks
+        self.is_open = False
+        self.hangover_left = 0.0
+        self.passed_chunks = 0
+        self.skipped_chunks = 0
+        self.skipped_seconds = 0.0
+
+    def process(self, samples, duration):
+        """
+        Decide whether a chunk should be transcribed.
+
+        Args:
+            samples (np.ndarray): Audio samples, either int16 PCM or float32 in [-1, 1].
+            duration (float): Length of the chunk in seconds.
+
+        Returns:
+            bool: True if the chunk should be transcribed, False if it was skipped.
+        """
+        level = level_db(samples)
+        threshold = self.close_threshold_db if self.is_open else self.open_threshold_db
+        if level >= threshold:
+            self.is_open = True
+            self.hangover_left = self.hangover_seconds
+        elif self.is_open and self.hangover_left > 0:
+            self.hangover_left -= duration
+        else:
+            self.is_open = False
+
+        if self.is_open:
+            self.passed_chunks += 1
+            return True
+
+        self.skipped_chunks += 1
+        self.skipped_seconds += duration
+        if self.skipped_chunks % self.report_every == 0:
+            logger.info(f"Energy gate skipped {self.skipped_chunks} chunks "
+                        f"({self.skipped_seconds:.1f} s of audio), passed {self.passed_chunks}")
+        return False
+
+def level_db(samples):
+    """Return the RMS level of the samples in dBFS. Digital silence returns -inf."""
+    if samples.size == 0:
+        return float('-inf')
+    if np.issubdtype(samples.dtype, np.integer):
+        samples = samples.astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(np.square(samples)))
+    if rms == 0:
+        return float('-inf')
+    return 20 * np.log10(rms)
+
+class StreamResampler:
+    """
+    Streaming polyphase FIR resampler that also downmixes interleaved 16-bit PCM to mono.
+
+    Filter history and phase are carried across calls, so feeding a stream block by block
+    gives the same output as resampling it in one piece, without clicks at block edges.
+    """
+    def __init__(self, input_rate, output_rate, channels=1, taps_per_phase=48):
+        divisor = math.gcd(int(input_rate), int(output_rate))
+        self.up = int(output_rate) // divisor
+        self.down = int(input_rate) // divisor
+        self.channels = channels
+        self.taps_per_phase = taps_per_phase
+
+        # Kaiser-windowed sinc low-pass just below the lower of the two Nyquist rates,
+        # designed at the upsampled rate and split into one sub-filter per output phase.
+        n_taps = taps_per_phase * self.up
+        cutoff = 0.45 / max(self.up, self.down)  # Cycles per upsampled sample
+        t = np.arange(n_taps) - (n_taps - 1) / 2
+        taps = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(n_taps, 8.0)
+        taps *= self.up / taps.sum()
+        self.phases = taps.reshape(taps_per_phase, self.up).T.astype(np.float32)
+
+        self.history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self.next_output = 0  # Upsampled position of the next output, relative to the current block
+
+    def process(self, data):
+        """
+        Downmix and resample the next block of the stream.
+
+        Args:
+            data (bytes): Interleaved 16-bit PCM with self.channels channels.
+
+        Returns:
+            np.ndarray: Mono float32 samples at the output rate.
+        """
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        if self.channels > 1:
+            samples = samples[:len(samples) - len(samples) % self.channels]
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        return self.resample(samples)
+
+    def resample(self, samples):
+        """Resample the next block of mono float32 samples."""
+        if self.up == self.down:
+            return samples.astype(np.float32)
+
+        extended = np.concatenate([self.history, samples])
+        positions = np.arange(self.next_output, len(samples) * self.up, self.down)
+        # Index into `extended` of the newest input sample each output depends on
+        newest = positions // self.up + len(self.history)
+        window = extended[newest[:, None] - np.arange(self.taps_per_phase)]
+        output = np.einsum('ij,ij->i', window, self.phases[positions % self.up])
+
+        self.next_output = (positions[-1] + self.down if len(positions) else self.next_output) - len(samples) * self.up
+        self.history = extended[len(extended) - len(self.history):]
+        return output.astype(np.float32)
@@ -0,0 +1,259 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import random
+import numpy as np
+import psutil
+import soundfile as sf
+
+import recorder
+import transcriber
+from pipeline import WorkQueue
+from metrics import metrics
+from capture import FileSource
+
+# Metrics where a higher value in the current run is a regression
+REGRESSION_METRICS = ['latency_p50', 'latency_p90', 'latency_p99', 'rtf', 'dropped_chunks', 'rss_peak_mb']
+
+class FakeSegment:
+    """Minimal stand-in for faster_whisper's Segment."""
+    def __init__(self, start, end, text, words):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.words = words
+        self.avg_logprob = -0.2
+
+class FakeWord:
+    """Minimal stand-in for faster_whisper's Word."""
+    def __init__(self, start, end, word):
+        self.start = start
+        self.end = end
+        self.word = word
+        self.probability = 1.0
+
+class FakeInfo:
+    """Minimal stand-in for faster_whisper's TranscriptionInfo."""
+    def __init__(self, duration):
+        self.language = "en"
+        self.language_probability = 1.0
+        self.duration = duration
+
+class FakeWhisperModel:
+    """
+    Deterministic stand-in for WhisperModel, so benchmark runs are reproducible without a model.
+
+    Each transcribe call sleeps for decode_delay + seconds_per_audio_second * duration (plus up to
+    `jitter` seconds of seeded random delay) and returns one segment describing the audio.
+    """
+    def __init__(self, decode_delay=0.2, seconds_per_audio_second=0.05, jitter=0.0, seed=0):
+        self.decode_delay = decode_delay
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio, **kwargs):
+        duration = sf.info(audio).duration if isinstance(audio, str) else len(audio) / transcriber.SAMPLE_RATE
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(self.decode_delay + self.seconds_per_audio_second * duration + extra)
+        words = [FakeWord(i * 0.5, min(duration, (i + 1) * 0.5), f" w{i}") for i in range(int(duration / 0.5))]
+        text = f" {duration:.1f} seconds of audio"
+        return iter([FakeSegment(0.0, duration, text, words)]), FakeInfo(duration)
+
+class TimedModel:
+    """Wraps a model and adds up the time spent in transcribe, including generating the segments."""
+    def __init__(self, model):
+        self.model = model
+        self.decode_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio, **kwargs):
+        start = time.time()
+        segments, info = self.model.transcribe(audio, **kwargs)
+        segments = list(segments)
+        with self.lock:
+            self.decode_seconds += time.time() - start
+        return segments, info
+
+class TrackedWorkQueue(WorkQueue):
+    """WorkQueue that remembers the capture time of every chunk put on it."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.capture_times = {}
+
+    def put(self, item):
+        self.capture_times[item.seq] = item.capture_time
+        super().put(item)
+
+class ResourceSampler:
+    """Samples CPU use and peak RSS of this process in the background."""
+    def __init__(self, interval=0.1):
+        self.process = psutil.Process()
+        self.interval = interval
+        self.rss_peak = 0
+        self.stopped = threading.Event()
+        self.cpu_start = sum(self.process.cpu_times()[:2])
+        self.wall_start = time.time()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.rss_peak = max(self.rss_peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def stop(self):
+        """Stop sampling and return (average CPU percent of one core, peak RSS in MB)."""
+        self.stopped.set()
+        self.thread.join()
+        cpu = sum(self.process.cpu_times()[:2]) - self.cpu_start
+        return 100 * cpu / max(time.time() - self.wall_start, 1e-9), self.rss_peak / 2**20
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+def run_benchmark(files, model, speed=1.0, settle=5.0):
+    """
+    Replay sound files through recorder.run_capture and transcriber.monitor_audio_queue.
+
+    Returns:
+        dict: Benchmark results.
+    """
+    audio_queue = TrackedWorkQueue(recorder.AUDIO_QUEUE_SIZE, recorder.QUEUE_POLICY, merge=recorder.merge_chunks,
+                                   on_shed=metrics.shed)
+    recorder.audio_queue = audio_queue
+    timed_model = TimedModel(model)
+    transcriber.models.factory = lambda device, model_size: timed_model
+
+    captions = []
+    def collect_captions():
+        while True:
+            caption = transcriber.transcription_queue.get()
+            captions.append((time.time(), caption))
+            # Stands in for the GUI, which ends each chunk's trace when it shows the caption
+            metrics.mark(caption.seq, "displayed")
+            metrics.finish(caption.seq, "displayed")
+
+    output_path = os.path.join(tempfile.mkdtemp(), "transcriptions.txt")
+    threading.Thread(target=collect_captions, daemon=True).start()
+    threading.Thread(target=transcriber.monitor_audio_queue, args=(audio_queue, output_path, "cpu"),
+                     daemon=True).start()
+    while transcriber.models.model is None:
+        time.sleep(0.01)
+
+    sampler = ResourceSampler()
+    start = time.time()
+    audio_seconds = 0.0
+    for path in files:
+        audio_seconds += sf.info(path).duration
+        source = FileSource(path, speed, recorder.CHUNK)
+        source.open()
+        try:
+            recorder.run_capture(source.read, source.sample_rate, source.channels)
+        finally:
+            source.close()
+
+    # Wait for the backlog to clear and the last captions to come in
+    last_count, last_change = -1, time.time()
+    while time.time() - last_change < settle:
+        if audio_queue.qsize() or len(captions) != last_count:
+            last_count, last_change = len(captions), time.time()
+        time.sleep(0.05)
+    wall_seconds = time.time() - start - settle
+    cpu_percent, rss_peak_mb = sampler.stop()
+
+    latencies = [shown - audio_queue.capture_times[caption.seq]
+                 for shown, caption in captions if caption.seq in audio_queue.capture_times]
+    return {
+        'files': len(files),
+        'audio_seconds': round(audio_seconds, 2),
+        'wall_seconds': round(wall_seconds, 2),
+        'speed': speed,
+        'chunks': len(audio_queue.capture_times),
+        'captions': len(captions),
+        'late_captions': sum(1 for _, caption in captions if caption.late),
+        'dropped_chunks': audio_queue.dropped,
+        'coalesced_chunks': audio_queue.coalesced,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'latency_max': max(latencies) if latencies else None,
+        'decode_seconds': round(timed_model.decode_seconds, 2),
+        'rtf': timed_model.decode_seconds / audio_seconds if audio_seconds else None,
+        'cpu_percent': round(cpu_percent, 1),
+        'rss_peak_mb': round(rss_peak_mb, 1),
+    }
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Print results next to the baseline and return the metrics that regressed by more than tolerance."""
+    regressions = []
+    print(f"{'metric':<18}{'baseline':>12}{'current':>12}{'change':>10}")
+    for metric, value in results.items():
+        base = baseline.get(metric)
+        change = ""
+        if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+            ratio = (value - base) / abs(base)
+            change = f"{ratio:+.1%}"
+            if metric in REGRESSION_METRICS and ratio > tolerance:
+                regressions.append(metric)
+        elif isinstance(value, (int, float)) and base == 0 and value > 0:
+            # No relative change from zero, so any increase counts, e.g. chunks starting to drop
+            change = "new"
+            if metric in REGRESSION_METRICS:
+                regressions.append(metric)
+        print(f"{metric:<18}{format_value(base):>12}{format_value(value):>12}{change:>10}")
+    return regressions
+
+def format_value(value):
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay audio files through the captioning pipeline and measure it")
+    parser.add_argument('audio_dir', help='Directory of WAV/FLAC files to replay, in name order')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed as a multiple of real time (0 = unpaced)')
+    parser.add_argument('--model', type=str, help='Use this real faster-whisper model instead of the fake model')
+    parser.add_argument('--decode-delay', type=float, default=0.2, help='Fake model: fixed seconds per decode')
+    parser.add_argument('--decode-rtf', type=float, default=0.05, help='Fake model: extra decode seconds per audio second')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Fake model: up to this many random extra seconds')
+    parser.add_argument('--seed', type=int, default=0, help='Fake model: random seed for the jitter')
+    parser.add_argument('--workers', type=int, help='Override transcription_workers')
+    parser.add_argument('--settle', type=float, default=5.0, help='Seconds without new captions that end the run')
+    parser.add_argument('--output', type=str, help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', type=str, help='Compare against results saved with --output')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression against the baseline')
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.audio_dir, '*.wav')) + glob.glob(os.path.join(args.audio_dir, '*.flac')))
+    if not files:
+        sys.exit(f"No WAV or FLAC files found in {args.audio_dir}")
+    if transcriber.BATCHED_INFERENCE and not args.model:
+        sys.exit("batched_inference needs a real model, pass --model")
+    if args.workers:
+        transcriber.TRANSCRIPTION_WORKERS = args.workers
+
+    if args.model:
+        model = transcriber.initialize_model("cpu", args.model)
+    else:
+        model = FakeWhisperModel(args.decode_delay, args.decode_rtf, args.jitter, args.seed)
+
+    results = run_benchmark(files, model, args.speed, args.settle)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for metric, value in results.items():
+            print(f"{metric:<18}{format_value(value):>12}")
@@ -35,6 +35,14 @@ def build_portable():
         '--add-data=transcriber.py;.',
         '--add-data=recorder.py;.',
         '--add-data=console.py;.',
+        '--add-data=audio_processing.py;.',
+        '--add-data=pipeline.py;.',
+        '--add-data=metrics.py;.',
+        '--add-data=ipc.py;.',
+        '--add-data=transcript.py;.',
+        '--add-data=capture.py;.',
+        '--add-data=spool.py;.',
+        '--add-data=replicas.py;.',
         f'--add-data={assets_path};faster_whisper/assets',
         # Add all necessary hidden imports
         '--hidden-import=queue',
@@ -48,6 +56,14 @@ def build_portable():
         '--hidden-import=threading',
         '--hidden-import=transcriber',
         '--hidden-import=recorder',
+        '--hidden-import=audio_processing',
+        '--hidden-import=pipeline',
+        '--hidden-import=metrics',
+        '--hidden-import=ipc',
+        '--hidden-import=transcript',
+        '--hidden-import=capture',
+        '--hidden-import=spool',
+        '--hidden-import=replicas',
         '--hidden-import=console',
         '--hidden-import=sounddevice',
         '--hidden-import=wave',
@@ -82,6 +98,14 @@ def build_portable():
         '--hidden-import=threading',
         '--hidden-import=transcriber',
         '--hidden-import=recorder',
+        '--hidden-import=audio_processing',
+        '--hidden-import=pipeline',
+        '--hidden-import=metrics',
+        '--hidden-import=ipc',
+        '--hidden-import=transcript',
+        '--hidden-import=capture',
+        '--hidden-import=spool',
+        '--hidden-import=replicas',
         '--hidden-import=sounddevice',
         '--hidden-import=wave',
         '--hidden-import=scipy',
@@ -0,0 +1,393 @@
+import glob
+import logging
+import os
+import sys
+import threading
+import time
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ("wasapi", "file", "pcm", "device")
+
+class CaptureSource:
+    """
+    A stream of interleaved 16-bit PCM audio for recorder.run_capture.
+
+    open() must set sample_rate and channels. read() returns the next block of
+    frames_per_block frames as bytes or a memoryview, valid until the next read(),
+    or None at the end of the stream.
+    """
+    def __init__(self, frames_per_block=2048):
+        self.frames_per_block = frames_per_block
+        self.sample_rate = None
+        self.channels = None
+
+    def open(self):
+        pass
+
+    def read(self):
+        raise NotImplementedError
+
+    def pause(self):
+        """Called when capture is paused."""
+
+    def resume(self):
+        """Called when capture is resumed."""
+
+    def close(self):
+        pass
+
+_pyaudio = None
+_pyaudio_lock = threading.Lock()
+_loopback_devices = None
+
+def get_pyaudio():
+    """Return the process-wide PyAudio instance, creating it on first use."""
+    global _pyaudio
+    # Imported here so the rest of the module works without the Windows-only pyaudiowpatch
+    import pyaudiowpatch as pyaudio
+    with _pyaudio_lock:
+        if _pyaudio is None:
+            _pyaudio = pyaudio.PyAudio()
+        return _pyaudio
+
+def get_audio_devices(refresh=False):
+    """
+    Get all available WASAPI loopback devices. The result is cached; pass refresh=True
+    to enumerate the devices again.
+    """
+    global _loopback_devices
+    if _loopback_devices is not None and not refresh:
+        return _loopback_devices
+    import pyaudiowpatch as pyaudio
+    devices = []
+    try:
+        p = get_pyaudio()
+        wasapi_info = p.get_host_api_info_by_type(pyaudio.paWASAPI)
+
+        for i in range(p.get_device_count()):
+            device_info = p.get_device_info_by_index(i)
+            # Check if the device is a loopback device
+            if device_info.get('hostApi') == wasapi_info['index'] and device_info.get('isLoopbackDevice', False):
+                devices.append({
+                    'index': i,
+                    'name': device_info.get('name', 'Unknown Device'),
+                    'defaultSampleRate': device_info.get('defaultSampleRate', 44100),
+                    'maxInputChannels': device_info.get('maxInputChannels', 2)
+                })
+                logger.info(f"Found loopback audio device: {device_info.get('name')} (Index: {i})")
+        _loopback_devices = devices
+    except Exception as e:
+        logger.error(f"Error getting audio devices: {e}")
+    return devices
+
+class RingBuffer:
+    """
+    Fixed-size byte ring filled by the audio callback thread and drained by the capture loop.
+
+    The buffer is allocated once. read() returns memoryview slices of it instead of copies; a slice
+    stays valid until the next read() or clear(), because the writer never overwrites data that has
+    not been released. When the reader falls behind and the ring is full, new audio is dropped and
+    counted in overruns rather than overwriting what the reader holds.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = memoryview(bytearray(capacity))
+        self.scratch = None  # Only needed for reads that wrap around the end
+        self.cond = threading.Condition()
+        # Total bytes written and released so far; positions in the ring are these modulo capacity
+        self.written = 0
+        self.released = 0
+        self.held = 0  # Size of the slice handed out by the last read
+        self.overruns = 0
+        self.closed = False
+
+    def write(self, data):
+        """
+        Append data from the producer thread.
+
+        Returns:
+            bool: False if the ring was full and the data was dropped.
+        """
+        data = memoryview(data).cast('B')
+        size = len(data)
+        with self.cond:
+            if self.written - self.released + size > self.capacity:
+                self.overruns += 1
+                return False
+            start = self.written % self.capacity
+        # Copy outside the lock: only the producer writes, and this region is free
+        first = min(size, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:size - first] = data[first:]
+        with self.cond:
+            self.written += size
+            self.cond.notify()
+        return True
+
+    def read(self, size, timeout=None):
+        """
+        Release the previous slice and wait for the next size bytes.
+
+        Returns:
+            memoryview: The next size bytes, fewer at the end of a closed ring, or None once
+                a closed ring is empty.
+
+        Raises:
+            TimeoutError: If no data arrives within timeout seconds.
+        """
+        with self.cond:
+            self.released += self.held
+            self.held = 0
+            if not self.cond.wait_for(lambda: self.written - self.released >= size or self.closed, timeout):
+                raise TimeoutError(f"No audio received for {timeout:.1f} s")
+            size = min(size, self.written - self.released)
+            if size == 0:
+                return None
+            self.held = size
+            start = self.released % self.capacity
+        if start + size <= self.capacity:
+            return self.buffer[start:start + size]
+        # The data wraps around the end of the ring, so join the two pieces
+        if self.scratch is None or len(self.scratch) < size:
+            self.scratch = memoryview(bytearray(size))
+        first = self.capacity - start
+        self.scratch[:first] = self.buffer[start:]
+        self.scratch[first:size] = self.buffer[:size - first]
+        return self.scratch[:size]
+
+    def clear(self):
+        """Drop everything buffered, including the slice last handed out."""
+        with self.cond:
+            self.released = self.written
+            self.held = 0
+
+    def close(self):
+        """Wake the reader; reads return what is left and then None."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class PortAudioSource(CaptureSource):
+    """
+    Base class for sources captured through PortAudio.
+
+    In callback mode PortAudio delivers audio on its own thread into a RingBuffer holding
+    RING_SECONDS of audio, so capture keeps up even while the capture loop waits on the GIL, and
+    read() returns memoryview slices of the ring. Otherwise read() makes blocking stream reads.
+    """
+    RING_SECONDS = 10
+
+    def __init__(self, device_index=None, sample_rate=None, channels=None, frames_per_block=2048,
+                 callback=True):
+        super().__init__(frames_per_block)
+        self.device_index = device_index
+        self.requested_rate = sample_rate
+        self.requested_channels = channels
+        self.callback = callback
+        self.ring = None
+        self.stream = None
+        self.pyaudio_module = None
+
+    def open_stream(self, p, pyaudio_module, device_index):
+        """Open the input stream on device_index once sample_rate and channels are set."""
+        self.pyaudio_module = pyaudio_module
+        block_bytes = self.frames_per_block * self.channels * 2
+        if self.callback:
+            # A whole number of blocks, so reads never wrap around the end of the ring
+            blocks = max(2, int(self.RING_SECONDS * self.sample_rate / self.frames_per_block))
+            self.ring = RingBuffer(blocks * block_bytes)
+        self.stream = p.open(format=pyaudio_module.paInt16,
+                             channels=self.channels,
+                             rate=self.sample_rate,
+                             input=True,
+                             frames_per_buffer=self.frames_per_block,
+                             input_device_index=device_index,
+                             stream_callback=self.on_audio if self.callback else None)
+
+    def on_audio(self, in_data, frame_count, time_info, status_flags):
+        """PortAudio stream callback: copy the audio into the ring and return straight away."""
+        if status_flags & self.pyaudio_module.paInputOverflow:
+            metrics.count("capture_overflows")
+        if in_data is not None and not self.ring.write(in_data):
+            metrics.count("capture_overruns")
+        return (None, self.pyaudio_module.paContinue)
+
+    def read(self):
+        if not self.callback:
+            return self.stream.read(self.frames_per_block, exception_on_overflow=False)
+        # Allow a few blocks of slack before treating a silent device as failed
+        timeout = max(2.0, 4 * self.frames_per_block / self.sample_rate)
+        return self.ring.read(self.frames_per_block * self.channels * 2, timeout)
+
+    def pause(self):
+        self.stream.stop_stream()
+
+    def resume(self):
+        if self.ring:
+            self.ring.clear()  # Audio from before the pause is stale
+        self.stream.start_stream()
+
+    def close(self):
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.ring:
+            self.ring.close()
+
+class WasapiLoopbackSource(PortAudioSource):
+    """What the speakers play, captured with WASAPI loopback through pyaudiowpatch (Windows only)."""
+    def __init__(self, device_index=None, sample_rate=44100, channels=2, frames_per_block=2048, callback=True):
+        super().__init__(device_index, sample_rate, channels, frames_per_block, callback)
+
+    def open(self):
+        import pyaudiowpatch as pyaudio
+        p = get_pyaudio()
+        # Get the specified or default loopback device
+        if self.device_index is not None:
+            device_info = p.get_device_info_by_index(self.device_index)
+            logger.info(f"Using selected device: {device_info.get('name')} (Index: {self.device_index})")
+        else:
+            device_info = p.get_default_wasapi_loopback()
+            self.device_index = device_info['index']
+            logger.info(f"Using default loopback device: {device_info.get('name')} (Index: {self.device_index})")
+
+        # Log device properties
+        logger.info(f"Device properties: {device_info}")
+        self.sample_rate = self.requested_rate
+        self.channels = self.requested_channels
+        self.open_stream(p, pyaudio, self.device_index)
+
+class DeviceSource(PortAudioSource):
+    """
+    An input device (microphone, line in, or a loopback/monitor device the OS exposes as
+    input) through the standard PortAudio bindings, so it works on Windows, macOS and Linux.
+    """
+    def __init__(self, device_index=None, sample_rate=None, channels=None, frames_per_block=2048, callback=True):
+        super().__init__(device_index, sample_rate, channels, frames_per_block, callback)
+        self.pyaudio = None
+
+    def open(self):
+        import pyaudio
+        self.pyaudio = pyaudio.PyAudio()
+        if self.device_index is None:
+            device_info = self.pyaudio.get_default_input_device_info()
+        else:
+            device_info = self.pyaudio.get_device_info_by_index(self.device_index)
+        logger.info(f"Using input device: {device_info.get('name')} (Index: {device_info['index']})")
+        self.sample_rate = int(self.requested_rate or device_info.get('defaultSampleRate', 44100))
+        self.channels = self.requested_channels or min(2, max(1, int(device_info.get('maxInputChannels', 1))))
+        self.open_stream(self.pyaudio, pyaudio, device_info['index'])
+
+    def close(self):
+        super().close()
+        if self.pyaudio:
+            self.pyaudio.terminate()
+            self.pyaudio = None
+
+class FileSource(CaptureSource):
+    """
+    Replays a WAV/FLAC file, paced at `speed` times real time (0 = as fast as it can be read),
+    for testing and profiling without an audio device.
+    """
+    def __init__(self, path, speed=1.0, frames_per_block=2048):
+        super().__init__(frames_per_block)
+        self.path = path
+        self.speed = speed
+        self.file = None
+        self.start = None
+        self.frames_read = 0
+        self.paused_at = None
+
+    def open(self):
+        import soundfile as sf
+        self.file = sf.SoundFile(self.path)
+        self.sample_rate = self.file.samplerate
+        self.channels = self.file.channels
+        self.start = time.time()
+        logger.info(f"Replaying {self.path} " + (f"at {self.speed}x real time" if self.speed > 0 else "unpaced"))
+
+    def read(self):
+        data = self.file.read(self.frames_per_block, dtype='int16', always_2d=True)
+        if len(data) == 0:
+            return None
+        self.frames_read += len(data)
+        if self.speed > 0:
+            delay = self.start + self.frames_read / self.sample_rate / self.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return data.tobytes()
+
+    def pause(self):
+        self.paused_at = time.time()
+
+    def resume(self):
+        # Don't try to catch up on the time spent paused
+        if self.paused_at:
+            self.start += time.time() - self.paused_at
+            self.paused_at = None
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+class PcmSource(CaptureSource):
+    """Raw interleaved 16-bit little-endian PCM from stdin ('-') or a file or FIFO."""
+    def __init__(self, path="-", sample_rate=16000, channels=1, frames_per_block=2048):
+        super().__init__(frames_per_block)
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.file = None
+
+    def open(self):
+        # Opening a FIFO blocks until a writer connects
+        self.file = sys.stdin.buffer if self.path == "-" else open(self.path, "rb")
+        logger.info(f"Reading raw PCM from {'stdin' if self.path == '-' else self.path}: "
+                    f"{self.sample_rate} Hz, {self.channels} channels")
+
+    def read(self):
+        data = self.file.read(self.frames_per_block * self.channels * 2)
+        if not data:
+            return None
+        return data[:len(data) - len(data) % (self.channels * 2)]  # Only whole frames
+
+    def close(self):
+        if self.file and self.file is not sys.stdin.buffer:
+            self.file.close()
+        self.file = None
+
+def create_sources(kind, path=None, device_index=None, sample_rate=44100, channels=2, speed=1.0,
+                   frames_per_block=2048, callback=True):
+    """
+    Return the capture sources to record from, one after the other.
+
+    Args:
+        kind (str): 'wasapi', 'file', 'pcm' or 'device'.
+        path (str): For 'file' a WAV/FLAC file or a directory of them (replayed in name order),
+            for 'pcm' a file or FIFO, or '-' for stdin.
+        device_index (int): Device for 'wasapi' and 'device'. Defaults to the system default.
+        sample_rate (int): Sample rate for 'wasapi' and 'pcm'.
+        channels (int): Channels for 'wasapi' and 'pcm'.
+        speed (float): Replay speed for 'file', as a multiple of real time (0 = unpaced).
+        callback (bool): Capture 'wasapi' and 'device' through the stream callback into a ring
+            buffer, rather than with blocking reads.
+    """
+    if kind == "file":
+        if os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, '*.wav')) + glob.glob(os.path.join(path, '*.flac')))
+        else:
+            paths = [path]
+        return [FileSource(p, speed, frames_per_block) for p in paths]
+    if kind == "pcm":
+        if not path:
+            raise ValueError("The pcm capture source needs capture_path: a file, a FIFO or '-' for stdin")
+        return [PcmSource(path, sample_rate, channels, frames_per_block)]
+    if kind == "device":
+        return [DeviceSource(device_index, frames_per_block=frames_per_block, callback=callback)]
+    if kind != "wasapi":
+        logger.warning(f"Unknown capture source '{kind}', using wasapi")
+    return [WasapiLoopbackSource(device_index, sample_rate, channels, frames_per_block, callback)]
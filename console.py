@@ -1,11 +1,87 @@
 import customtkinter as ctk
-from tkinter import scrolledtext
+from tkinter import scrolledtext, TclError
 import threading
-import queue
+import collections
 import sys
 
+MAX_LINES = 2000  # Console lines kept; older lines are dropped
+RENDER_INTERVAL = 200  # Minimum ms between redraws while messages keep arriving
+LEVELS = {"All": 0, "Warnings and errors": 1, "Errors only": 2}
+
+def message_level(message):
+    """Return 2 for errors, 1 for warnings and 0 for anything else."""
+    if "ERROR" in message or "Error" in message:
+        return 2
+    if "WARNING" in message or "Warning" in message:
+        return 1
+    return 0
+
+class ConsoleBuffer:
+    """
+    Ring buffer of the last MAX_LINES console lines, owned by the launcher so memory stays
+    bounded whether or not the console window is open.
+
+    Repeats of the same line are collapsed into one line with a count. Lines carry consecutive
+    serial numbers, so a window can fetch only what changed. A listener, set by the window, is
+    called from the writing thread when lines arrive; a burst causes one call until the window
+    reads the buffer again.
+    """
+    def __init__(self, max_lines=MAX_LINES):
+        self.lines = collections.deque(maxlen=max_lines)  # [message, level, repeat count, serial]
+        self.next_serial = 0  # Serial number of the next line added
+        self.lock = threading.Lock()
+        self.listener = None
+        self.notified = False
+
+    def put(self, message):
+        """Add a message, collapsing it into the last line if it repeats it."""
+        message = message.rstrip("\n")
+        with self.lock:
+            if self.lines and self.lines[-1][0] == message:
+                self.lines[-1][2] += 1
+            else:
+                self.lines.append([message, message_level(message), 1, self.next_serial])
+                self.next_serial += 1
+            if self.notified or self.listener is None:
+                return
+            self.notified = True
+            listener = self.listener
+        listener()
+
+    def set_listener(self, listener):
+        """Set the callable to notify when lines arrive, or None. It is called from the writing thread."""
+        with self.lock:
+            self.listener = listener
+            self.notified = False
+
+    def read(self, since=0):
+        """
+        Return the lines from serial number since on, and re-arm the listener.
+
+        Returns:
+            tuple: (serial of the oldest line kept, serial of the next line, copies of the lines).
+        """
+        with self.lock:
+            self.notified = False
+            lines = []
+            for line in reversed(self.lines):
+                if line[3] < since:
+                    break
+                lines.append(list(line))
+            lines.reverse()
+            first_serial = self.lines[0][3] if self.lines else self.next_serial
+            return first_serial, self.next_serial, lines
+
 class ConsoleWindow(ctk.CTkToplevel):
-    def __init__(self, console_queue, master=None, icon_path=None):
+    """
+    Console output window showing a ConsoleBuffer.
+
+    The text widget is only updated while the window is visible, at most every RENDER_INTERVAL
+    ms: new lines are appended, lines that fell out of the buffer are deleted from the top and
+    a changed repeat count rewrites the last line, so a selection survives while logs flow.
+    Only opening the window or changing the filter redraws the whole buffer.
+    """
+    def __init__(self, console_buffer, master=None, icon_path=None):
         super().__init__(master)
         self.title("Console Output")
         self.geometry("600x400")
@@ -14,7 +90,20 @@ class ConsoleWindow(ctk.CTkToplevel):
         if icon_path:
             self.iconbitmap(icon_path)
 
-        self.console_queue = console_queue
+        self.console_buffer = console_buffer
+        self.rendered_serial = 0  # Lines before this serial have been rendered (or filtered out)
+        self.shown = collections.deque()  # [serial, text lines, repeat count] of the lines in the widget
+        self.shown_lines = 0  # Text lines in the widget
+        self.min_level = 0
+        self.dirty = True
+        self.full_render = True
+        self.render_scheduled = False
+
+        # Level filter
+        self.level_selection = ctk.StringVar(value="All")
+        self.level_menu = ctk.CTkOptionMenu(self, values=list(LEVELS), variable=self.level_selection,
+                                            command=self.on_level_change)
+        self.level_menu.pack(anchor='e', padx=5, pady=5)
 
         # ScrolledText widget for displaying console output
         self.text_area = scrolledtext.ScrolledText(
@@ -27,30 +116,108 @@ class ConsoleWindow(ctk.CTkToplevel):
             highlightthickness=0
         )
         self.text_area.pack(expand=True, fill='both')
+        self.text_area.tag_configure("warning", foreground='#e0c060')
+        self.text_area.tag_configure("error", foreground='#ff6060')
         self.text_area.configure(state='disabled')
 
-        # Start the update loop
-        self.after(100, self.update_console)
+        # Redraw when lines arrive
+        self.bind("<<ConsoleReady>>", lambda event: self.update_console())
+        console_buffer.set_listener(self.wake)
+        self.bind("<Destroy>", self.on_destroy)
+        self.bind("<Map>", lambda event: self.schedule_render())  # Catch up when shown
+        self.schedule_render()
 
-    def update_console(self):
-        """Check the queue for new console messages and display them."""
+    def wake(self):
+        """Schedule update_console on the Tk thread. Safe to call from any thread."""
         try:
-            while True:
-                message = self.console_queue.get_nowait()
-                self.display_message(message)
-        except queue.Empty:
+            self.event_generate("<<ConsoleReady>>", when="tail")
+        except (TclError, RuntimeError):
             pass
-        self.after(100, self.update_console)
 
-    def display_message(self, message):
-        """Insert the message into the text area."""
+    def on_destroy(self, event):
+        if event.widget is self:
+            self.console_buffer.set_listener(None)
+
+    def update_console(self):
+        """Schedule a redraw for the lines that arrived."""
+        self.dirty = True
+        self.schedule_render()
+
+    def on_level_change(self, selection):
+        self.min_level = LEVELS[selection]
+        self.dirty = True
+        self.full_render = True
+        self.schedule_render()
+
+    def schedule_render(self):
+        if not self.render_scheduled:
+            self.render_scheduled = True
+            self.after(RENDER_INTERVAL, self.render)
+
+    def render(self):
+        """Bring the text up to date with the buffer, if the window is visible."""
+        self.render_scheduled = False
+        if not self.dirty or not self.winfo_viewable():
+            return
+        self.dirty = False
+        first, last = self.text_area.yview()
+        at_bottom = last >= 1.0
+        full_render = self.full_render
+        self.full_render = False
         self.text_area.configure(state='normal')
-        self.text_area.insert(ctk.END, message + "\n")
+        if full_render:
+            self.redraw()
+        else:
+            self.update_text()
         self.text_area.configure(state='disabled')
-        self.text_area.yview(ctk.END)
+        if at_bottom:
+            self.text_area.yview(ctk.END)
+        elif full_render:
+            self.text_area.yview_moveto(first)  # Keep the user's place when they have scrolled up
+
+    def redraw(self):
+        """Replace the text with the whole buffer, with one insert."""
+        _, self.rendered_serial, lines = self.console_buffer.read()
+        self.text_area.delete("1.0", ctk.END)
+        self.shown.clear()
+        self.shown_lines = 0
+        self.insert_lines(lines)
+
+    def update_text(self):
+        """Delete lines that fell out of the buffer, rewrite a changed repeat count and append new lines."""
+        # Fetch the newest line rendered last time again too, in case its repeat count went up
+        first_serial, next_serial, lines = self.console_buffer.read(max(0, self.rendered_serial - 1))
+        dropped = 0
+        while self.shown and self.shown[0][0] < first_serial:
+            dropped += self.shown.popleft()[1]
+        if dropped:
+            self.text_area.delete("1.0", f"{dropped + 1}.0")
+            self.shown_lines -= dropped
+        if lines and lines[0][3] < self.rendered_serial:
+            line = lines.pop(0)
+            if self.shown and self.shown[-1][0] == line[3] and self.shown[-1][2] != line[2]:
+                _, count_lines, _ = self.shown.pop()
+                self.text_area.delete(f"{self.shown_lines - count_lines + 1}.0", "end-1c")
+                self.shown_lines -= count_lines
+                self.insert_lines([line])
+        self.rendered_serial = next_serial
+        self.insert_lines(lines)
+
+    def insert_lines(self, lines):
+        """Append buffer lines that pass the level filter to the text."""
+        chunks = []  # Alternating text and tags, as taken by Text.insert
+        for message, level, count, serial in lines:
+            if level < self.min_level:
+                continue
+            text = message if count == 1 else f"{message}  (x{count})"
+            chunks += [text + "\n", ("", "warning", "error")[level]]
+            self.shown.append([serial, text.count("\n") + 1, count])
+            self.shown_lines += text.count("\n") + 1
+        if chunks:
+            self.text_area.insert(ctk.END, *chunks)
 
 class QueueWriter:
-    """A writer object that redirects writes to a queue."""
+    """A writer object that redirects writes to a queue, or a ConsoleBuffer."""
     def __init__(self, log_queue):
         self.log_queue = log_queue
 
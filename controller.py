@@ -2,59 +2,213 @@ import os
 import sys
 import ctypes
 import threading
-import recorder
-import transcriber
-from gui import SubtitleGUI
-import queue
+from metrics import metrics, timeline
+from ipc import events
+from capture import SOURCES
 import time
 import argparse
 import configparser
+import multiprocessing
 
-# Update the import statement for the GUI
-from gui import SubtitleGUI  # No change needed
+# The recorder, transcriber and GUI are imported under __main__. CPU model replicas are spawned
+# processes that re-run this module's top level, and they need none of them, nor the CUDA DLLs.
 
-# Change the hardcoded path to a relative path
-cuda_dll_path = os.path.join(os.path.dirname(__file__), "nvidia_dependencies")
-os.environ['PATH'] = f"{cuda_dll_path}{os.pathsep}{os.environ['PATH']}"
-sys.path.append(cuda_dll_path)
+def load_cuda_dlls():
+    """
+    Put the bundled CUDA libraries on the DLL search path and load cuDNN. Only Windows builds
+    bundle them; elsewhere CUDA comes from the system and the file, pcm and device sources run
+    without it.
+    """
+    # Change the hardcoded path to a relative path
+    cuda_dll_path = os.path.join(os.path.dirname(__file__), "nvidia_dependencies")
+    if sys.platform != "win32" or not os.path.isdir(cuda_dll_path):
+        return
+    os.environ['PATH'] = f"{cuda_dll_path}{os.pathsep}{os.environ['PATH']}"
+    sys.path.append(cuda_dll_path)
 
-# Explicitly add the DLL to the DLL search path
-os.add_dll_directory(cuda_dll_path)
+    # Explicitly add the DLL to the DLL search path
+    os.add_dll_directory(cuda_dll_path)
 
-try:
-    ctypes.CDLL(os.path.join(cuda_dll_path, "cudnn_ops_infer64_8.dll"))
-    print("Successfully loaded cudnn_ops_infer64_8.dll", flush=True)
-except Exception as e:
-    print(f"Error loading cudnn_ops_infer64_8.dll: {e}", flush=True)
+    try:
+        ctypes.CDLL(os.path.join(cuda_dll_path, "cudnn_ops_infer64_8.dll"))
+        print("Successfully loaded cudnn_ops_infer64_8.dll", flush=True)
+    except Exception as e:
+        print(f"Error loading cudnn_ops_infer64_8.dll: {e}", flush=True)
+
+def capture_lanes(device_indexes, source):
+    """
+    Work out which devices to caption at once.
+
+    Args:
+        device_indexes (list): Devices selected with --device-index and extra_capture_devices.
+        source (str): Capture source.
+
+    Returns:
+        dict: Source label -> device index, or None to capture a single source.
+    """
+    devices = list(dict.fromkeys(device_indexes))
+    if len(devices) < 2:
+        return None
+    if source not in ("wasapi", "device") or not recorder.IN_MEMORY_AUDIO or recorder.STREAMING:
+        print("Several capture devices need the wasapi or device source and in-memory, non-streaming "
+              "transcription; capturing only the first", flush=True)
+        return None
+    names = {}
+    if source == "wasapi":
+        names = {device['index']: device['name'] for device in recorder.get_audio_devices()}
+    lanes = {}
+    for device_index in devices:
+        label = names.get(device_index, "Default device" if device_index is None else f"Device {device_index}")
+        if label in lanes:
+            label = f"{label} ({device_index})"
+        lanes[label] = device_index
+    return lanes
+
+def latency_targets(lanes):
+    """Read per-source latency targets from source_latency_targets in config.ini, in device order."""
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    targets = [float(t) for t in config.get('Settings', 'source_latency_targets', fallback='').split(',') if t.strip()]
+    return dict(zip(lanes, targets))
 
 def start_recording():
     """Start the audio recording process."""
-    device_index = args.device_index if hasattr(args, 'device_index') else None
-    recorder.record_audio(device_index)
+    try:
+        source = args.source or recorder.CAPTURE_SOURCE
+        if args.daemon and source == "pcm" and (args.source_path or recorder.CAPTURE_PATH) == "-":
+            # As a daemon stdin carries the launcher's commands, so it can't carry audio as well
+            raise ValueError("Raw PCM can't be read from stdin when running as a daemon; "
+                             "set capture_path to a file or FIFO")
+        if lanes:
+            recorder.record_sources(lanes, args.source)
+        else:
+            recorder.record_audio(device_indexes[0], args.source, args.source_path, args.speed)
+    except Exception as e:
+        print(f"Audio capture stopped: {e}", flush=True)
+        events.emit("error", message=f"Audio capture stopped: {e}")
 
 def start_transcription(device):
     """Start the audio transcription process."""
+    if lanes:
+        transcriber.monitor_sources(
+            recorder.source_queues,
+            transcriber.TRANSCRIPTION_OUTPUT,
+            device=device,
+            chunk_length=recorder.chunk_length,
+            latency_targets=latency_targets(lanes)
+        )
+        return
+    if recorder.STREAMING:
+        transcriber.monitor_audio_stream(
+            recorder.audio_queue,
+            transcriber.TRANSCRIPTION_OUTPUT,
+            device=device
+        )
+        return
+    if recorder.IN_MEMORY_AUDIO:
+        transcriber.monitor_audio_queue(
+            recorder.audio_queue,
+            transcriber.TRANSCRIPTION_OUTPUT,
+            device=device,
+            chunk_length=recorder.chunk_length
+        )
+        return
     transcriber.monitor_audio_file(
         transcriber.AUDIO_INPUT_DIR,
         transcriber.TRANSCRIPTION_OUTPUT,
         check_interval=0.2,
-        device=device
+        device=device,
+        chunk_length=recorder.chunk_length
     )
 
-def start_gui(update_queue, intelligent_mode):
+subtitle_gui = None
+
+def start_gui(update_queue, intelligent_mode, paused=False):
     """Start the GUI for displaying subtitles."""
-    gui = SubtitleGUI(update_queue, intelligent_mode)
-    gui.run()
+    global subtitle_gui
+    subtitle_gui = SubtitleGUI(update_queue, intelligent_mode, paused, list(lanes) if lanes else None)
+    subtitle_gui.run()
+
+def pause_captions():
+    """Stop capturing audio and hide the captions, keeping the model loaded."""
+    recorder.capture_enabled.clear()
+    recorder.clear_audio_queues()
+    if subtitle_gui:
+        subtitle_gui.set_paused(True)
+    print("Captions paused.", flush=True)
+
+def resume_captions():
+    """Resume capturing audio and showing captions."""
+    recorder.clear_audio_queues()
+    # Each Start begins a new transcript, with subtitle timestamps from zero
+    transcriber.start_transcripts(transcriber.TRANSCRIPTION_OUTPUT, lanes or ())
+    for archive in list(recorder.archives.values()):
+        archive.start_session()
+    recorder.capture_enabled.set()
+    if subtitle_gui:
+        subtitle_gui.set_paused(False)
+    print("Captions resumed.", flush=True)
+
+def report_metrics(interval=5.0):
+    """Send the pipeline counters to the launcher every interval seconds."""
+    while True:
+        time.sleep(interval)
+        with metrics.lock:
+            counters = dict(metrics.counters)
+        events.emit("metrics", counters=counters)
+
+def read_commands():
+    """
+    Read control commands from stdin when running as a daemon: 'start' and 'stop' resume and
+    pause captions, 'model <size>' hot-swaps the model, 'quit' (or the launcher closing the
+    pipe) exits.
+    """
+    for line in sys.stdin:
+        command = line.strip()
+        if command == "start":
+            resume_captions()
+        elif command == "stop":
+            pause_captions()
+        elif command.startswith("model "):
+            # Load the new model next to the current one and swap between chunks
+            transcriber.models.swap(command.split()[1])
+        elif command == "quit":
+            break
+    print("Exiting program.", flush=True)
+    transcriber.close_transcripts()
+    for archive in list(recorder.archives.values()):
+        archive.close()
+    os._exit(0)
 
 if __name__ == "__main__":
+    # Lets the frozen Controller.exe start CPU model replica processes
+    multiprocessing.freeze_support()
+    load_cuda_dlls()
+    import recorder
+    import transcriber
+    from gui import SubtitleGUI
+    # faster_whisper is only imported when the model loads, in parallel with the audio device and GUI
+    timeline.mark("imports done")
     parser = argparse.ArgumentParser(description="TranscriberX Application")
     parser.add_argument('--intelligent', action='store_true', help='Enable intelligent mode')
     parser.add_argument('--cuda', action='store_true', help='Enable CUDA for transcription')
     parser.add_argument('--model', type=str, choices=['tiny', 'base', 'small', 'medium', 'large'], 
                         help='Select the model size for transcription')
-    parser.add_argument('--device-index', type=int, help='Audio device index for recording')
+    parser.add_argument('--device-index', type=int, nargs='+',
+                        help='Audio device index for recording; give several to caption them at the same time')
+    parser.add_argument('--source', choices=SOURCES,
+                        help='Capture source, overriding capture_source in config.ini')
+    parser.add_argument('--source-path', help="File or directory to replay, or FIFO / '-' for raw PCM")
+    parser.add_argument('--speed', type=float, help='Replay speed for the file source (0 = as fast as possible)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Start paused and take start/stop/quit commands on stdin, keeping the model loaded')
+    parser.add_argument('--ipc-port', type=int, help='Send events to the launcher listening on this localhost port')
     args = parser.parse_args()
 
+    if args.ipc_port:
+        events.connect(args.ipc_port)
+        threading.Thread(target=report_metrics, daemon=True).start()
+
     # Update config with the selected model
     config = configparser.ConfigParser()
     config.read('config.ini')
@@ -66,18 +220,33 @@ if __name__ == "__main__":
     # Create a queue for GUI updates
     transcription_queue = transcriber.transcription_queue
 
+    # Devices to capture, and a caption lane per device when there are several
+    device_indexes = (args.device_index or [None]) + recorder.EXTRA_CAPTURE_DEVICES
+    lanes = capture_lanes(device_indexes, args.source or recorder.CAPTURE_SOURCE)
+
     # Determine device based on '--cuda' flag
     device = "cuda" if args.cuda else "cpu"
 
+    if args.daemon:
+        # Wait for a start command before capturing
+        recorder.capture_enabled.clear()
+    else:
+        # Capture starts right away, so start the transcripts now, with timestamps from zero
+        transcriber.start_transcripts(transcriber.TRANSCRIPTION_OUTPUT, lanes or ())
+
+    metrics.start_exporters()
+
     # Create threads for recording, transcription, and GUI
     recording_thread = threading.Thread(target=start_recording, daemon=True)
     transcription_thread = threading.Thread(target=start_transcription, args=(device,), daemon=True)
-    gui_thread = threading.Thread(target=start_gui, args=(transcription_queue, args.intelligent), daemon=True)
+    gui_thread = threading.Thread(target=start_gui, args=(transcription_queue, args.intelligent, args.daemon), daemon=True)
 
-    # Start the threads
-    recording_thread.start()
+    # Start the threads, the model load first since it takes longest
     transcription_thread.start()
+    recording_thread.start()
     gui_thread.start()
+    if args.daemon:
+        threading.Thread(target=read_commands, daemon=True).start()
 
     # Keep the main thread alive
     try:
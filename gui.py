@@ -3,13 +3,52 @@ from tkinter import scrolledtext
 import threading
 import queue
 import time
+import collections
+import configparser
+from metrics import metrics, timeline
+
+# Load configuration
+config = configparser.ConfigParser()
+config.read("config.ini")
+# 'event': producers wake the window when captions arrive; 'poll': check the queue every 100 ms
+GUI_WAKEUP = config.get('Settings', 'gui_wakeup', fallback='event')
+POLL_INTERVAL = 100  # ms between queue checks when polling
+IDLE_CHECK_INTERVAL = 1000  # ms between checks for pause requests and intelligent-mode hiding
+
+SCROLLBACK_LINES = 200  # Caption lines kept in the window
+TRIM_BATCH = 50  # Extra lines allowed before trimming, so old lines are deleted in bulk
+
+class Caption:
+    """
+    A caption update for SubtitleGUI. Plain strings put on the queue are treated
+    as complete caption lines.
+
+    A tentative caption replaces the previous tentative tail and may be revised
+    by the next update; committed captions are permanent. Late captions arrived
+    after later chunks were already shown and are marked as such.
+    """
+    def __init__(self, text, tentative=False, end_of_line=True, late=False, seq=None, source=None):
+        self.text = text
+        self.tentative = tentative
+        self.end_of_line = end_of_line
+        self.late = late
+        self.seq = seq  # Capture sequence number of the chunk, if known
+        self.source = source  # Label of the capture source, when captioning several at once
 
 class SubtitleGUI:
-    def __init__(self, update_queue, intelligent_mode=False):
+    """
+    Frameless always-on-top caption window. With several capture sources, pass their labels as
+    lanes to show each source's captions in its own labelled area.
+    """
+    LANE_HEIGHT = 120  # Pixels per caption lane
+
+    def __init__(self, update_queue, intelligent_mode=False, paused=False, lanes=None):
         self.update_queue = update_queue
         self.intelligent_mode = intelligent_mode
         self.last_activity_time = time.time()
         self.should_show = False
+        self.paused = paused
+        self.pause_requested = paused
 
         self.root = tk.Tk()
         
@@ -18,7 +57,7 @@ class SubtitleGUI:
         
         # Set window size and position
         window_width = 800
-        window_height = 120
+        window_height = self.LANE_HEIGHT * max(1, len(lanes or []))
         screen_width = self.root.winfo_screenwidth()
         screen_height = self.root.winfo_screenheight()
         x_position = (screen_width // 2) - (window_width // 2)
@@ -34,33 +73,59 @@ class SubtitleGUI:
         # Set background color to dark grey
         self.root.configure(bg='#2e2e2e')  # Dark grey color
         
+        # One text area per caption lane; a single unlabelled one unless several sources are captioned
+        self.lanes = {}
+        for label in lanes or [None]:
+            self.lanes[label] = self.create_lane(label)
+        self.text_area = next(iter(self.lanes.values()))
+        
+        # Variables to keep track of dragging
+        self.offset_x = 0
+        self.offset_y = 0
+
+        if self.intelligent_mode or self.paused:
+            self.root.withdraw()  # Hide window initially
+
+        # Wake up when captions arrive if the queue supports it, otherwise poll
+        self.event_driven = GUI_WAKEUP == 'event' and hasattr(update_queue, 'set_listener')
+        if self.event_driven:
+            self.root.bind("<<CaptionsReady>>", lambda event: self.update_subtitles())
+            update_queue.set_listener(self.wake)
+
+        # Start the update loop in the main thread
+        self.root.after(100, self.poll)
+        timeline.mark("GUI created")
+
+    def create_lane(self, label):
+        """Create the text area for a caption lane, under a heading with the label if given."""
+        if label is not None:
+            heading = tk.Label(self.root, text=label, anchor='w', bg='#2e2e2e', fg='#a0a0a0',
+                               font=("Helvetica", 11))
+            heading.pack(fill='x')
+            heading.bind("<ButtonPress-1>", self.start_move)
+            heading.bind("<ButtonRelease-1>", self.stop_move)
+            heading.bind("<B1-Motion>", self.do_move)
+
         # ScrolledText widget for displaying subtitles
-        self.text_area = scrolledtext.ScrolledText(
+        text_area = scrolledtext.ScrolledText(
             self.root,
             wrap=tk.WORD,
             bg='#2e2e2e',  # Match the window background
             fg='white',
-            font=("Helvetica", 24),
+            font=("Helvetica", 24 if label is None else 20),
             borderwidth=0,
             highlightthickness=0
         )
-        self.text_area.pack(expand=True, fill='both')
-        self.text_area.configure(state='disabled')
-        
-        # Bind mouse events for dragging the window
-        self.text_area.bind("<ButtonPress-1>", self.start_move)
-        self.text_area.bind("<ButtonRelease-1>", self.stop_move)
-        self.text_area.bind("<B1-Motion>", self.do_move)
-        
-        # Variables to keep track of dragging
-        self.offset_x = 0
-        self.offset_y = 0
+        text_area.pack(expand=True, fill='both')
+        text_area.tag_configure("tentative", foreground='#a0a0a0')
+        text_area.tag_configure("late", foreground='#d0b070')
+        text_area.configure(state='disabled')
 
-        if self.intelligent_mode:
-            self.root.withdraw()  # Hide window initially
-
-        # Start the update loop in the main thread
-        self.root.after(100, self.update_subtitles)
+        # Bind mouse events for dragging the window
+        text_area.bind("<ButtonPress-1>", self.start_move)
+        text_area.bind("<ButtonRelease-1>", self.stop_move)
+        text_area.bind("<B1-Motion>", self.do_move)
+        return text_area
 
     def start_move(self, event):
         """Record the offset when the user starts dragging the window."""
@@ -78,33 +143,126 @@ class SubtitleGUI:
         y = self.root.winfo_pointery() - self.offset_y
         self.root.geometry(f"+{x}+{y}")
 
+    def set_paused(self, paused):
+        """Hide (and clear on resume) the captions. Safe to call from any thread."""
+        self.pause_requested = paused
+        if self.event_driven:
+            self.wake()
+
+    def wake(self):
+        """Schedule update_subtitles on the Tk thread. Safe to call from any thread."""
+        try:
+            self.root.event_generate("<<CaptionsReady>>", when="tail")
+        except (tk.TclError, RuntimeError):
+            pass  # Window closing or main loop not running yet; poll() picks the captions up
+
+    def poll(self):
+        """
+        Update the subtitles periodically. Queue checks are only needed when polling; with
+        event wakeup this just catches pause requests and hides the window in intelligent mode.
+        """
+        self.update_subtitles()
+        self.root.after(IDLE_CHECK_INTERVAL if self.event_driven else POLL_INTERVAL, self.poll)
+
+    def apply_pause(self):
+        """Apply a pause or resume requested through set_paused."""
+        self.paused = self.pause_requested
+        self.should_show = False
+        if self.paused:
+            self.root.withdraw()
+            return
+        for text_area in self.lanes.values():
+            text_area.configure(state='normal')
+            text_area.delete("1.0", tk.END)
+            text_area.configure(state='disabled')
+        if not self.intelligent_mode:
+            self.root.deiconify()
+
     def update_subtitles(self):
         """Check the queue for new transcriptions and display them."""
+        if self.pause_requested != self.paused:
+            self.apply_pause()
+        queued_since = self.update_queue.acknowledge() if hasattr(self.update_queue, 'acknowledge') else None
+        captions = []
         try:
             while True:
                 transcription = self.update_queue.get_nowait()
-                self.display_transcription(transcription)
-                if self.intelligent_mode:
-                    self.last_activity_time = time.time()
-                    if not self.should_show:
-                        self.root.deiconify()
-                        self.should_show = True
+                if self.paused:
+                    continue
+                if not isinstance(transcription, Caption):
+                    transcription = Caption(transcription)
+                captions.append(transcription)
         except queue.Empty:
             pass
+        if captions:
+            self.display_captions(captions)
+            if queued_since:
+                self.root.update_idletasks()  # Draw now, so the measurement includes the redraw
+                metrics.observe('gui_latency_seconds', time.time() - queued_since)
+            if self.intelligent_mode:
+                self.last_activity_time = time.time()
+                if not self.should_show:
+                    self.root.deiconify()
+                    self.should_show = True
 
         if self.intelligent_mode:
             if self.should_show and (time.time() - self.last_activity_time > 4):
                 self.root.withdraw()
                 self.should_show = False
 
-        self.root.after(100, self.update_subtitles)  # Check every 100 ms
+    def display_transcription(self, caption):
+        """Insert the caption into the text area, replacing any tentative tail."""
+        self.display_captions([caption])
+
+    def display_captions(self, captions):
+        """Render a batch of captions, each lane's with a single insert and scroll."""
+        by_lane = collections.defaultdict(list)
+        for caption in captions:
+            # Captions from sources without a lane of their own go to the first lane
+            by_lane[caption.source if caption.source in self.lanes else None].append(caption)
+        for lane, lane_captions in by_lane.items():
+            self.render_lane(self.lanes.get(lane, self.text_area), lane_captions)
+
+        now = time.time()
+        for caption in captions:
+            if caption.seq is not None:
+                metrics.mark(caption.seq, "displayed", now)
+                metrics.finish(caption.seq, "displayed")
+                if caption.late:
+                    metrics.count("captions_late")
+
+    def render_lane(self, text_area, captions):
+        """
+        Render captions in one text area. Each caption replaces the tentative tail, so only a
+        tentative caption at the end of the batch is shown.
+        """
+        chunks = []  # Alternating text and tags, as taken by Text.insert
+        for caption in captions:
+            if caption.tentative:
+                continue
+            if caption.late:
+                chunks += [f"(late) {caption.text}\n", "late"]
+            else:
+                chunks += [caption.text + ("\n" if caption.end_of_line else " "), ()]
+        if captions[-1].tentative and captions[-1].text:
+            chunks += [captions[-1].text, "tentative"]
+
+        text_area.configure(state='normal')
+        tail = text_area.tag_ranges("tentative")
+        if tail:
+            text_area.delete(tail[0], tail[-1])
+        if chunks:
+            text_area.insert(tk.END, *chunks)
+            timeline.mark("first caption")
+        self.trim_scrollback(text_area)
+        text_area.configure(state='disabled')
+        text_area.yview(tk.END)
 
-    def display_transcription(self, transcription):
-        """Insert the transcription into the text area."""
-        self.text_area.configure(state='normal')
-        self.text_area.insert(tk.END, transcription + "\n")
-        self.text_area.configure(state='disabled')
-        self.text_area.yview(tk.END)
+    def trim_scrollback(self, text_area):
+        """Delete the oldest lines in one go once there are TRIM_BATCH more than SCROLLBACK_LINES."""
+        lines = int(text_area.index("end-1c").split(".")[0])
+        if lines > SCROLLBACK_LINES + TRIM_BATCH:
+            text_area.delete("1.0", f"{lines - SCROLLBACK_LINES + 1}.0")
 
     def run(self):
         """Run the Tkinter main loop."""
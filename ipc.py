@@ -0,0 +1,117 @@
+import json
+import socket
+import struct
+import threading
+
+# Every message is a 4-byte big-endian length followed by that many bytes of UTF-8 JSON
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_BYTES = 1 << 20
+
+def send_message(sock, message):
+    """Send one framed message (a dict) over the socket."""
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+def read_message(sock):
+    """
+    Read one framed message from the socket.
+
+    Returns:
+        dict: The message, or None if the other end closed the connection.
+    """
+    header = read_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE_BYTES:
+        raise ValueError(f"IPC message of {length} bytes is too large")
+    data = read_exactly(sock, length)
+    if data is None:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+def read_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = sock.recv(size - len(buffer))
+        if not data:
+            return None
+        buffer.extend(data)
+    return bytes(buffer)
+
+class EventChannel:
+    """
+    Controller side of the event channel to the launcher.
+
+    Events are dicts with an 'event' type: chunk_started, chunk_finished, caption, metrics,
+    model_switched, restart_required or error. Until connect() is called (e.g. when the controller runs on its
+    own, or in benchmarks) emitting an event does nothing.
+    """
+    def __init__(self):
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def connect(self, port):
+        """Connect to the launcher listening on localhost:port."""
+        self.sock = socket.create_connection(("127.0.0.1", port))
+
+    def emit(self, event, **fields):
+        """Send an event to the launcher, if connected."""
+        if self.sock is None:
+            return
+        fields['event'] = event
+        with self.lock:
+            try:
+                send_message(self.sock, fields)
+            except OSError:
+                # The launcher went away; keep running and stop sending
+                self.sock = None
+
+class EventListener:
+    """Launcher side of the event channel: listens on a free localhost port for one controller."""
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+
+    def accept(self, is_alive, poll_interval=1.0):
+        """
+        Wait for the controller to connect.
+
+        Args:
+            is_alive (callable): Returns False once the controller has exited, to stop waiting.
+
+        Returns:
+            socket.socket: The connection, or None if the controller exited first.
+        """
+        self.server.settimeout(poll_interval)
+        try:
+            while is_alive():
+                try:
+                    connection, _ = self.server.accept()
+                    connection.settimeout(None)
+                    return connection
+                except socket.timeout:
+                    continue
+            return None
+        finally:
+            self.server.close()
+
+    def messages(self, is_alive):
+        """Yield the controller's messages until it disconnects."""
+        connection = self.accept(is_alive)
+        if connection is None:
+            return
+        with connection:
+            while True:
+                try:
+                    message = read_message(connection)
+                except (OSError, ValueError):
+                    return
+                if message is None:
+                    return
+                yield message
+
+# Channel the controller's transcriber and controller report events on
+events = EventChannel()
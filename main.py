@@ -3,13 +3,13 @@ import subprocess
 import sys
 import os
 import threading
-import queue  # New import for queue
 import time   # New import for sleep
 import configparser  # New import for config handling
 import webbrowser  # Add this import at the top
 
-from console import ConsoleWindow, QueueWriter  # Importing ConsoleWindow and QueueWriter from console.py
+from console import ConsoleWindow, ConsoleBuffer, QueueWriter
 from setupGUI import run_setup  # Add this import at the top
+from ipc import EventListener
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
@@ -70,14 +70,16 @@ class App(ctk.CTk):
         self.model_selection = ctk.StringVar()
         self.app_running = False
         self.process = None
+        self.process_args = None  # Arguments the running controller was launched with
 
-        # Redirect stdout and stderr to the console queue
-        self.console_queue = queue.Queue()
-        sys.stdout = QueueWriter(self.console_queue)
-        sys.stderr = QueueWriter(self.console_queue)
+        # Redirect stdout and stderr to the console buffer, which keeps the last lines whether
+        # or not the console window is open
+        self.console_buffer = ConsoleBuffer()
+        sys.stdout = QueueWriter(self.console_buffer)
+        sys.stderr = QueueWriter(self.console_buffer)
 
         # Initialize the console window
-        self.console_window = ConsoleWindow(self.console_queue, self)
+        self.console_window = ConsoleWindow(self.console_buffer, self)
         self.console_window.withdraw()  # Start hidden
 
         self.config = configparser.ConfigParser()
@@ -156,7 +158,7 @@ class App(ctk.CTk):
             self.model_frame,
             values=["tiny", "base", "small", "medium", "large"],
             variable=self.model_selection,
-            command=self.save_config  # Save config on change
+            command=self.on_model_change
         )
         self.model_dropdown.pack(side="left")
 
@@ -205,9 +207,14 @@ class App(ctk.CTk):
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         # Add these as class attributes
-        self.TRANSCRIPTION_TIMEOUT = 5  # seconds
-        self.last_transcription_start = 0
-        self.current_transcription_file = None
+        # The controller abandons slow chunks itself and asks for a restart when chunks keep failing,
+        # so this only catches a controller that has stopped responding altogether
+        self.TRANSCRIPTION_TIMEOUT = 30  # seconds
+        # Time the controller gets to flush its transcripts and close the audio archive on 'quit'
+        self.QUIT_TIMEOUT = 6  # seconds
+        self.running_chunks = {}  # seq -> (start time, name) of chunks the controller is decoding
+        self.controller_metrics = {}  # Latest pipeline counters reported by the controller
+        self.last_controller_error = None
         self.timeout_thread = None
         self.stop_timeout = threading.Event()
 
@@ -255,8 +262,7 @@ class App(ctk.CTk):
 
     def start_app(self):
         # Reset the timeout tracking variables
-        self.last_transcription_start = 0
-        self.current_transcription_file = None
+        self.running_chunks = {}
         
         base_dir = get_base_path()
         recordings_path = os.path.join(base_dir, "recordings")
@@ -288,6 +294,24 @@ class App(ctk.CTk):
             self.enqueue_console_message(f"Error emptying transcriptions.txt: {e}")
 
         self.start_button.configure(text="Stop", fg_color="red", hover_color="dark red")
+        args = self.build_controller_args(base_dir)
+
+        if self.process and self.process.poll() is None and args == self.process_args:
+            # The controller is still running with the same settings, so just resume it
+            self.send_command("start")
+        else:
+            self.terminate_process()
+            self.launch_controller(args)
+        self.app_running = True
+
+        self.stop_timeout.clear()
+        self.timeout_thread = threading.Thread(target=self.monitor_timeout, daemon=True)
+        self.timeout_thread.start()
+
+        threading.Thread(target=self.watch_console_queue, daemon=True).start()
+
+    def build_controller_args(self, base_dir):
+        """Build the controller command line for the current settings."""
         intelligent = self.intelligent_mode.get()
         cuda = self.gpu_enabled.get()
         model = self.model_selection.get()
@@ -310,35 +334,67 @@ class App(ctk.CTk):
         device_index = next((device['index'] for device in self.devices if device['name'] == selected_device), None)
         if device_index is not None:
             args.extend(["--device-index", str(device_index)])
-        
+        return args
+
+    def launch_controller(self, args):
+        """
+        Launch the controller as a daemon that keeps the model loaded between Start and Stop,
+        and tell it to start captioning.
+        """
+        # Structured events come over a local socket, stdout only carries log text
+        listener = EventListener()
         # If running in a frozen state, ensure subprocess handles executable correctly
         self.process = subprocess.Popen(
-            args,
+            args + ["--daemon", "--ipc-port", str(listener.port)],
+            stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,  # Merge stderr into stdout
             text=True,
             bufsize=1,
             universal_newlines=True
         )
-        self.app_running = True
-
-        self.stop_timeout.clear()
-        self.timeout_thread = threading.Thread(target=self.monitor_timeout, daemon=True)
-        self.timeout_thread.start()
+        self.process_args = args
+        threading.Thread(target=self.read_process_output, args=(self.process,), daemon=True).start()
+        threading.Thread(target=self.read_process_events, args=(self.process, listener), daemon=True).start()
+        self.send_command("start")
 
-        threading.Thread(target=self.read_process_output, daemon=True).start()
-        threading.Thread(target=self.watch_console_queue, daemon=True).start()
-
-    def stop_app(self):
+    def send_command(self, command):
+        """Send a control command to the controller daemon."""
+        try:
+            self.process.stdin.write(command + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.enqueue_console_message(f"Error sending '{command}' to controller.py: {e}")
+
+    def terminate_process(self):
+        """
+        Stop the controller process, unloading the model. It is asked to quit first, so it can
+        flush its transcripts and finish the audio archive, and only terminated if it doesn't.
+        """
         if self.process:
-            try:
-                self.process.terminate()
-                # Wait for a short time for graceful termination
-                self.process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                # Force kill if process doesn't terminate gracefully
-                self.process.kill()
+            if self.process.poll() is None:
+                self.send_command("quit")
+                try:
+                    self.process.stdin.close()
+                except (OSError, ValueError):
+                    pass
+                try:
+                    self.process.wait(timeout=self.QUIT_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    try:
+                        self.process.terminate()
+                        # Wait for a short time for graceful termination
+                        self.process.wait(timeout=2)
+                    except subprocess.TimeoutExpired:
+                        # Force kill if process doesn't terminate gracefully
+                        self.process.kill()
             self.process = None
+            self.process_args = None
+
+    def stop_app(self):
+        # Pause the controller but keep it running, so the next Start doesn't reload the model
+        if self.process and self.process.poll() is None:
+            self.send_command("stop")
         self.start_button.configure(text="Start", fg_color="green", hover_color="dark green")
         self.app_running = False
         self.stop_timeout.set()
@@ -348,49 +404,69 @@ class App(ctk.CTk):
 
     def monitor_timeout(self):
         while self.app_running and not self.stop_timeout.is_set():
-            if self.last_transcription_start > 0:
-                elapsed_time = time.time() - self.last_transcription_start
+            running = list(self.running_chunks.values())
+            if running:
+                started, name = min(running)
+                elapsed_time = time.time() - started
                 if elapsed_time > self.TRANSCRIPTION_TIMEOUT:
-                    error_msg = f"Transcription timeout for {self.current_transcription_file} after {self.TRANSCRIPTION_TIMEOUT} seconds"
-                    self.enqueue_console_message(f"controller.py ERROR: {error_msg}")
-                    self.stop_app()
-                    time.sleep(1)  # Give it a moment to clean up
-                    self.start_app()  # Restart the application
+                    error_msg = f"Transcription timeout for {name} after {self.TRANSCRIPTION_TIMEOUT} seconds"
+                    if self.last_controller_error:
+                        error_msg += f" (last error: {self.last_controller_error})"
+                    self.restart_controller(error_msg)
                     break
             time.sleep(1)
 
-    def read_process_output(self):
+    def restart_controller(self, error_msg):
+        """Log the error and restart the controller, reloading the model."""
+        self.enqueue_console_message(f"controller.py ERROR: {error_msg}")
+        self.terminate_process()
+        self.stop_app()
+        time.sleep(1)  # Give it a moment to clean up
+        self.start_app()  # Restart the application
+
+    def read_process_output(self, process):
         """Read and process lines from the subprocess's combined stdout and stderr."""
-        if self.process.stdout:
-            for line in iter(self.process.stdout.readline, ''):
+        if process.stdout:
+            for line in iter(process.stdout.readline, ''):
                 if not line:
                     break
                 line = line.strip()
 
-                # Check for transcription start
-                if "Starting transcription for" in line:
-                    self.last_transcription_start = time.time()
-                    self.current_transcription_file = line.split("...")[-2].split("recordings\\")[-1]
-
-                # Check for transcription completion or error
-                if "Transcription completed" in line or "Error during transcription" in line:
-                    self.last_transcription_start = 0  # Reset the timer
-                    self.current_transcription_file = None
-
                 # Determine if the line is an error message
                 if "ERROR" in line:
                     self.enqueue_console_message(f"controller.py ERROR: {line}")
                 else:
                     self.enqueue_console_message(f"controller.py: {line}")
 
+    def read_process_events(self, process, listener):
+        """Handle the controller's structured events until it exits."""
+        for event in listener.messages(lambda: process.poll() is None):
+            if process is not self.process:
+                continue  # Events from a controller that has been replaced
+            kind = event.get('event')
+            if kind == "chunk_started":
+                self.running_chunks[event['seq']] = (time.time(), event['name'])
+            elif kind == "chunk_finished":
+                self.running_chunks.pop(event['seq'], None)
+            elif kind == "model_switched" and self.process_args:
+                # Keep track of the model the controller is running after a hot swap
+                self.process_args[self.process_args.index("--model") + 1] = event['model']
+            elif kind == "metrics":
+                self.controller_metrics = event['counters']
+            elif kind == "restart_required" and self.app_running:
+                self.restart_controller(f"Restarting after repeated transcription failures: {event['reason']}")
+            elif kind == "error":
+                # The controller also logs the error, so just keep it for the watchdog's report
+                self.last_controller_error = event['message']
+
     def enqueue_console_message(self, message):
-        """Helper method to enqueue messages to the console queue."""
-        self.console_queue.put(message)
+        """Helper method to add messages to the console buffer."""
+        self.console_buffer.put(message)
 
     def open_console(self):
         """Open the console window."""
         if not self.console_window or not self.console_window.winfo_exists():
-            self.console_window = ConsoleWindow(self.console_queue, self)
+            self.console_window = ConsoleWindow(self.console_buffer, self)
         else:
             self.console_window.deiconify()
             self.console_window.focus()
@@ -409,6 +485,12 @@ class App(ctk.CTk):
         from recorder import get_audio_devices
         return get_audio_devices()
 
+    def on_model_change(self, selected_model):
+        """Save the model choice and hot-swap it in the running controller, if any."""
+        self.save_config()
+        if self.process and self.process.poll() is None:
+            self.send_command(f"model {selected_model}")
+
     def on_device_change(self, selected_device_name):
         """Handle changes in the selected audio device."""
         # Find the selected device info
@@ -427,15 +509,7 @@ class App(ctk.CTk):
             self.stop_app()
         
         # Ensure the process is terminated
-        if self.process:
-            try:
-                self.process.terminate()
-                # Wait for a short time for graceful termination
-                self.process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                # Force kill if process doesn't terminate gracefully
-                self.process.kill()
-            self.process = None
+        self.terminate_process()
 
         # Destroy the console window if it exists
         if self.console_window and self.console_window.winfo_exists():
@@ -0,0 +1,227 @@
+import collections
+import configparser
+import json
+import os
+import psutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Load configuration
+config = configparser.ConfigParser()
+config.read("config.ini")
+TRACE_FILE = config.get('Settings', 'metrics_trace_file', fallback='')  # JSON-lines file of per-chunk traces
+METRICS_FILE = config.get('Settings', 'metrics_file', fallback='')  # Prometheus text file, rewritten periodically
+METRICS_PORT = config.getint('Settings', 'metrics_port', fallback=0)  # Serve /metrics on localhost if set
+METRICS_INTERVAL = 5.0  # Seconds between rewrites of METRICS_FILE
+MAX_OPEN_TRACES = 1000  # Traces that never finish (e.g. skipped late chunks) are evicted past this
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0)
+GUI_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+# Spans reported per chunk, as (span, start mark, end mark)
+SPANS = (
+    ("capture", "capture_start", "captured"),
+    ("save", "save_start", "saved"),
+    ("discovery", "captured", "discovered"),
+    ("queue", "queued", "dequeued"),
+    ("decode", "decode_start", "decode_end"),
+    ("reorder", "decode_end", "released"),
+    ("display", "released", "displayed"),
+)
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, as exported by Prometheus."""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class Metrics:
+    """
+    Per-chunk latency tracing plus counters and histograms for the whole pipeline.
+
+    Pipeline stages call mark(seq, event) as a chunk passes through them, and finish(seq, outcome)
+    when the chunk is done. Finished traces are written as JSON lines with the time spent in each
+    span, and update the decode time and end-to-end latency histograms.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.traces = collections.OrderedDict()  # seq -> {'name': ..., 'marks': {...}}
+        self.counters = collections.Counter()
+        self.gauges = {}  # (name, label, label value) -> value
+        self.histograms = {
+            'decode_seconds': Histogram(),
+            'latency_seconds': Histogram(),
+            'gui_latency_seconds': Histogram(GUI_BUCKETS),  # Caption queue to screen
+        }
+        self.trace_file = None
+
+    def start_chunk(self, seq, name, capture_start, captured, source=None):
+        """Start a trace for a chunk captured between the two timestamps, from the labelled source if given."""
+        with self.lock:
+            self.counters['chunks_captured'] += 1
+            self.traces[seq] = {'name': name, 'marks': {'capture_start': capture_start, 'captured': captured}}
+            if source is not None:
+                self.traces[seq]['source'] = source
+            while len(self.traces) > MAX_OPEN_TRACES:
+                old_seq, trace = self.traces.popitem(last=False)
+                self._write_trace(old_seq, trace, "unfinished")
+
+    def mark(self, seq, event, timestamp=None):
+        """Record the time a chunk reached a pipeline stage."""
+        with self.lock:
+            trace = self.traces.get(seq)
+            if trace is not None:
+                trace['marks'][event] = timestamp or time.time()
+
+    def finish(self, seq, outcome):
+        """
+        End a chunk's trace.
+
+        Args:
+            seq (int): Capture sequence number of the chunk.
+            outcome (str): What happened to it, e.g. 'displayed', 'empty', 'failed', 'dropped'.
+        """
+        with self.lock:
+            trace = self.traces.pop(seq, None)
+            self.counters[f'chunks_{outcome}'] += 1
+            if trace is None:
+                return
+            marks = trace['marks']
+            if 'decode_start' in marks and 'decode_end' in marks:
+                self.histograms['decode_seconds'].observe(marks['decode_end'] - marks['decode_start'])
+            if 'displayed' in marks:
+                self.histograms['latency_seconds'].observe(marks['displayed'] - marks['captured'])
+            self._write_trace(seq, trace, outcome)
+
+    def shed(self, chunk, reason):
+        """End the trace of a chunk a WorkQueue dropped or merged, for use as its on_shed callback."""
+        self.finish(chunk.seq, reason)
+
+    def count(self, name, amount=1):
+        """Increase a counter."""
+        with self.lock:
+            self.counters[name] += amount
+
+    def set_gauge(self, name, value, label=None, label_value=None):
+        """Set a gauge, optionally one of a family distinguished by a label."""
+        with self.lock:
+            self.gauges[(name, label, label_value)] = value
+
+    def observe(self, name, value):
+        """Add a value to one of the histograms."""
+        with self.lock:
+            self.histograms[name].observe(value)
+
+    def _write_trace(self, seq, trace, outcome):
+        if not TRACE_FILE:
+            return
+        if self.trace_file is None:
+            self.trace_file = open(TRACE_FILE, "a", buffering=1)
+        marks = trace['marks']
+        spans = {span: round(marks[end] - marks[start], 4)
+                 for span, start, end in SPANS if start in marks and end in marks}
+        if 'displayed' in marks:
+            spans['end_to_end'] = round(marks['displayed'] - marks['captured'], 4)
+        record = {'seq': seq, 'name': trace['name'], 'outcome': outcome, 'marks': marks, 'spans': spans}
+        if 'source' in trace:
+            record['source'] = trace['source']
+        self.trace_file.write(json.dumps(record) + "\n")
+
+    def prometheus_text(self):
+        """Return all counters, gauges and histograms in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE systemcaptioner_{name}_total counter")
+                lines.append(f"systemcaptioner_{name}_total {value}")
+            typed = set()
+            for (name, label, label_value), value in sorted(self.gauges.items(), key=str):
+                if name not in typed:
+                    lines.append(f"# TYPE systemcaptioner_{name} gauge")
+                    typed.add(name)
+                labels = f'{{{label}="{label_value}"}}' if label else ""
+                lines.append(f"systemcaptioner_{name}{labels} {value}")
+            for name, histogram in self.histograms.items():
+                lines.append(f"# TYPE systemcaptioner_{name} histogram")
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'systemcaptioner_{name}_bucket{{le="{bound}"}} {count}')
+                lines.append(f'systemcaptioner_{name}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"systemcaptioner_{name}_sum {histogram.sum:.6f}")
+                lines.append(f"systemcaptioner_{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n" + timeline.prometheus_text()
+
+    def start_exporters(self):
+        """Start writing METRICS_FILE and serving METRICS_PORT, if configured."""
+        if METRICS_FILE:
+            threading.Thread(target=self._write_metrics_file, daemon=True).start()
+        if METRICS_PORT:
+            server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT), MetricsRequestHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            print(f"Serving metrics on http://127.0.0.1:{METRICS_PORT}/metrics", flush=True)
+
+    def _write_metrics_file(self):
+        while True:
+            time.sleep(METRICS_INTERVAL)
+            try:
+                with open(METRICS_FILE + ".tmp", "w") as f:
+                    f.write(self.prometheus_text())
+                os.replace(METRICS_FILE + ".tmp", METRICS_FILE)
+            except OSError as e:
+                print(f"Error writing metrics file {METRICS_FILE}: {e}", flush=True)
+
+class StartupTimeline:
+    """
+    Log how long after the process started each startup step finished, from imports to the
+    first caption, so time-to-first-caption can be tracked. Only the first mark of a step counts.
+    """
+    def __init__(self):
+        self.process_start = psutil.Process().create_time()
+        self.steps = {}  # step -> seconds since process start
+        self.lock = threading.Lock()
+
+    def mark(self, step):
+        with self.lock:
+            if step in self.steps:
+                return
+            self.steps[step] = time.time() - self.process_start
+        print(f"Startup: {step} after {self.steps[step]:.2f} s", flush=True)
+
+    def prometheus_text(self):
+        with self.lock:
+            steps = dict(self.steps)
+        if not steps:
+            return ""
+        lines = ["# TYPE systemcaptioner_startup_seconds gauge"]
+        lines += [f'systemcaptioner_startup_seconds{{step="{step}"}} {seconds:.3f}' for step, seconds in steps.items()]
+        return "\n".join(lines) + "\n"
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves the Prometheus text format on /metrics."""
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console
+
+# Metrics shared by the recorder, transcriber and GUI
+metrics = Metrics()
+timeline = StartupTimeline()
@@ -0,0 +1,527 @@
+import threading
+import time
+import queue
+import collections
+
+class ReorderBuffer:
+    """
+    Release per-chunk transcription results in capture order.
+
+    Chunks are registered with their capture sequence number when they are submitted, and
+    results are held back until every earlier registered chunk has finished. If the oldest
+    chunk is still running after `deadline` seconds it stops holding up the others; when its
+    result arrives it is either dropped (late_policy "skip") or released marked as late
+    (late_policy "mark"). The same applies to a chunk registered after a later one was released.
+    A cancelled chunk stops holding up the others at once and its result is ignored.
+    """
+    def __init__(self, release, deadline=6.0, late_policy="mark"):
+        self.release = release  # Called as release(seq, result, late) for each non-empty result
+        self.deadline = deadline
+        self.late_policy = late_policy
+        self.lock = threading.Lock()
+        self.waiting = {}  # seq -> submit time
+        self.results = {}
+        self.last_released = -1  # Highest sequence number released or given up on
+        self.late_chunks = 0
+        self.cancelled = set()
+
+    def register(self, seq):
+        """Record that the chunk with this sequence number has been submitted."""
+        with self.lock:
+            if seq > self.last_released:
+                self.waiting[seq] = time.time()
+            else:
+                self.late_chunks += 1
+
+    def complete(self, seq, result):
+        """Hand in the result for a chunk. Empty results just free the chunk's slot."""
+        with self.lock:
+            if seq in self.cancelled:
+                self.cancelled.discard(seq)
+                return
+            if seq not in self.waiting:
+                # Later chunks have already been released
+                if result and self.late_policy == "mark":
+                    self.release(seq, result, True)
+                return
+            self.results[seq] = result
+            self._drain()
+
+    def cancel(self, seq):
+        """Give up on a chunk: stop waiting for it and ignore its result if it still arrives."""
+        with self.lock:
+            self.cancelled.add(seq)
+            self.waiting.pop(seq, None)
+            self._drain()
+
+    def expire_overdue(self):
+        """Stop waiting for the oldest chunks if they have passed the deadline."""
+        with self.lock:
+            now = time.time()
+            while self.waiting:
+                seq = min(self.waiting)
+                if seq in self.results or now - self.waiting[seq] <= self.deadline:
+                    break
+                del self.waiting[seq]
+                self.last_released = max(self.last_released, seq)
+                self.late_chunks += 1
+                print(f"Chunk {seq} missed the {self.deadline} s caption deadline", flush=True)
+            self._drain()
+
+    def _drain(self):
+        while self.waiting:
+            seq = min(self.waiting)
+            if seq not in self.results:
+                break
+            del self.waiting[seq]
+            self.last_released = max(self.last_released, seq)
+            result = self.results.pop(seq)
+            if result:
+                self.release(seq, result, False)
+
+class NotifyingQueue(queue.Queue):
+    """
+    Queue that calls a listener when items arrive, so a consumer such as a Tk window can
+    sleep until there is work instead of polling.
+
+    Bursts are coalesced: after the first put the listener is not called again until the
+    consumer calls acknowledge(), which it does right before draining the queue.
+    """
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.listener = None
+        self.notified = False
+        self.pending_since = None  # When the oldest item not yet acknowledged was put
+
+    def set_listener(self, listener):
+        """Set the callable to notify, or None. It is called from the producing thread."""
+        self.listener = listener
+        with self.mutex:
+            self.notified = False
+        if listener and not self.empty():
+            self._notify()
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        self._notify()
+
+    def acknowledge(self):
+        """
+        Re-arm notifications before draining the queue.
+
+        Returns:
+            float: time.time() when the oldest waiting item was put, or None.
+        """
+        with self.mutex:
+            since = self.pending_since
+            self.notified = False
+            self.pending_since = None
+        return since
+
+    def _notify(self):
+        with self.mutex:
+            if self.pending_since is None:
+                self.pending_since = time.time()
+            if self.notified or self.listener is None:
+                return
+            self.notified = True
+        self.listener()
+
+class BatchScheduler:
+    """
+    Collect pending chunks from a queue into batches for one batched model call.
+
+    A batch is closed when it reaches max_batch_size or when no further chunk arrives
+    within max_wait seconds of the first one.
+    """
+    def __init__(self, max_batch_size=8, max_wait=0.05):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+    def next_batch(self, source_queue, timeout=0.2):
+        """Return the next batch of chunks, or an empty list if none arrived within timeout."""
+        try:
+            batch = [source_queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Take whatever is already waiting, then wait out the rest of max_wait
+                batch.append(source_queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(source_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+class WorkQueue:
+    """
+    Bounded queue of chunks waiting for transcription, with a load-shedding policy.
+
+    Policies:
+        drop-oldest: when full, the oldest waiting chunk is dropped.
+        newest-first: chunks are handed out newest first, and the oldest is dropped when full,
+            so captions track live audio and the backlog is only worked off when there is time.
+        coalesce: adjacent waiting chunks are merged into one longer chunk (up to
+            max_coalesce_seconds), so a backlog costs fewer model calls. Needs a merge function,
+            otherwise it behaves like drop-oldest.
+
+    Items only need `capture_time` and, for coalescing, `duration` attributes. get/get_nowait
+    raise queue.Empty like queue.Queue. If on_shed is given it is called as on_shed(item, reason)
+    for every item that is dropped ("dropped") or merged into an earlier one ("coalesced").
+    """
+    POLICIES = ("drop-oldest", "newest-first", "coalesce")
+
+    def __init__(self, maxsize, policy="drop-oldest", merge=None, max_coalesce_seconds=24.0, on_shed=None):
+        if policy not in self.POLICIES:
+            print(f"Unknown queue policy '{policy}', using drop-oldest", flush=True)
+            policy = "drop-oldest"
+        self.maxsize = maxsize
+        self.policy = policy
+        self.merge = merge if policy == "coalesce" else None
+        self.max_coalesce_seconds = max_coalesce_seconds
+        self.on_shed = on_shed
+        self.listener = None  # Called after every put, see set_listener
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_report = 0.0
+
+    def put(self, item):
+        """Add an item without blocking, shedding load if the queue is full."""
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                # Merge the oldest adjacent pair that still fits, otherwise drop the oldest chunk
+                pair = next((i for i in range(len(self.items) - 1)
+                             if self.merge and self._can_merge(self.items[i], self.items[i + 1])), None)
+                if pair is not None:
+                    merged = self.items[pair + 1]
+                    self.items[pair] = self.merge([self.items[pair], merged])
+                    del self.items[pair + 1]
+                    self.coalesced += 1
+                    self._shed(merged, "coalesced")
+                else:
+                    dropped = self.items.popleft()
+                    self.dropped += 1
+                    print(f"Transcription queue full, dropping chunk {getattr(dropped, 'name', dropped)}", flush=True)
+                    self._shed(dropped, "dropped")
+            self.items.append(item)
+            self.condition.notify()
+        if self.listener:
+            self.listener()
+
+    def set_listener(self, listener):
+        """Set a callable to call (from the producing thread) after each put, or None."""
+        self.listener = listener
+
+    def peek(self):
+        """Return the item get() would return next without removing it, or None if empty."""
+        with self.condition:
+            if not self.items:
+                return None
+            return self.items[-1] if self.policy == "newest-first" else self.items[0]
+
+    def get(self, timeout=None):
+        """Remove and return the next item, waiting up to timeout seconds (forever if None)."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items, timeout):
+                raise queue.Empty
+            if self.policy == "newest-first":
+                return self.items.pop()
+            item = self.items.popleft()
+            if self.merge:
+                backlog = [item]
+                while self.items and self._can_merge(backlog[-1], self.items[0], backlog):
+                    backlog.append(self.items.popleft())
+                if len(backlog) > 1:
+                    self.coalesced += len(backlog) - 1
+                    item = self.merge(backlog)
+                    for merged in backlog[1:]:
+                        self._shed(merged, "coalesced")
+            return item
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def qsize(self):
+        return len(self.items)
+
+    def clear(self):
+        """
+        Discard all waiting items.
+
+        Returns:
+            int: The number of items discarded.
+        """
+        with self.condition:
+            cleared = list(self.items)
+            self.items.clear()
+        for item in cleared:
+            self._shed(item, "cleared")
+        return len(cleared)
+
+    def lag(self):
+        """Seconds since the oldest waiting audio was captured, or 0 if nothing is waiting."""
+        with self.condition:
+            # A merged chunk's capture_time is when its last part ended, so use its start when known
+            times = [getattr(item, "start_time", item.capture_time) for item in self.items
+                     if hasattr(item, "capture_time")]
+        return time.time() - min(times) if times else 0.0
+
+    def report(self, interval=10.0):
+        """Print queue depth, lag and shed counts, at most once per interval while there is a backlog."""
+        now = time.time()
+        if now - self.last_report < interval or not (self.items or self.dropped or self.coalesced):
+            return
+        self.last_report = now
+        print(f"Transcription queue depth: {self.qsize()}, lag: {self.lag():.1f} s, "
+              f"dropped: {self.dropped}, coalesced: {self.coalesced}", flush=True)
+
+    def _shed(self, item, reason):
+        if self.on_shed:
+            self.on_shed(item, reason)
+
+    def _can_merge(self, first, second, backlog=None):
+        duration = sum(item.duration for item in (backlog or [first])) + second.duration
+        return duration <= self.max_coalesce_seconds
+
+class FairScheduler:
+    """
+    Picks the next chunk to decode from several sources' WorkQueues sharing one model.
+
+    Each source has a latency target. The waiting chunk whose capture_time plus its source's target
+    comes first is picked (earliest deadline first), so sources with tighter targets are served
+    sooner and a chunk never waits behind later-due work. So that one busy source can't hold every
+    worker, a source already running its share of the workers is only picked when no other source
+    has work waiting.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.sources = {}  # name -> (WorkQueue, latency target in seconds)
+        self.running = {}  # key -> source name of chunks being decoded
+        self.condition = threading.Condition()
+
+    def add(self, name, work_queue, latency_target):
+        """Add a source. Its queue wakes the scheduler when chunks arrive."""
+        self.sources[name] = (work_queue, latency_target)
+        work_queue.set_listener(self._wake)
+
+    def get(self, timeout=None):
+        """
+        Remove and return the next chunk, waiting up to timeout seconds.
+
+        Returns:
+            tuple: (source name, chunk).
+
+        Raises:
+            queue.Empty: If no chunk arrived in time.
+        """
+        end = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while True:
+                picked = self._pick()
+                if picked:
+                    return picked
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self.condition.wait(remaining)
+
+    def started(self, name, key):
+        """Record that a chunk from the source is being decoded."""
+        with self.condition:
+            self.running[key] = name
+
+    def finished(self, key):
+        """
+        Record that a chunk finished or was abandoned. Safe to call more than once.
+
+        Returns:
+            str: The chunk's source name, or None if it was already finished.
+        """
+        with self.condition:
+            name = self.running.pop(key, None)
+            self.condition.notify_all()  # The source may be back under its share
+            return name
+
+    def _pick(self):
+        share = max(1, -(-self.workers // max(1, len(self.sources))))  # Workers per source, rounded up
+        busy = collections.Counter(self.running.values())
+        best = None
+        for name, (work_queue, target) in self.sources.items():
+            head = work_queue.peek()
+            if head is None:
+                continue
+            # Sources under their share go first, then earliest deadline
+            key = (busy[name] >= share, head.capture_time + target)
+            if best is None or key < best[0]:
+                best = (key, name)
+        if best is None:
+            return None
+        work_queue = self.sources[best[1]][0]
+        try:
+            return best[1], work_queue.get_nowait()
+        except queue.Empty:
+            return self._pick()  # Cleared in the meantime, try the other sources
+
+    def _wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+class CircuitBreaker:
+    """
+    Count transcription failures and trip after `threshold` of them in a row.
+
+    A single bad or slow chunk is just skipped, but a transcriber that keeps failing calls
+    on_trip(reason) so it can be restarted. Any success resets the count.
+    """
+    def __init__(self, threshold=3, on_trip=None):
+        self.threshold = threshold
+        self.on_trip = on_trip
+        self.failures = 0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self, reason):
+        """Count a failure. Returns True if this one tripped the breaker."""
+        with self.lock:
+            self.failures += 1
+            tripped = self.failures >= self.threshold
+            if tripped:
+                self.failures = 0
+                self.trips += 1
+        if tripped and self.on_trip:
+            self.on_trip(reason)
+        return tripped
+
+class WorkerPool:
+    """
+    Run chunk jobs on up to `workers` threads, each with a deadline.
+
+    A job still running `timeout` seconds after it started is abandoned: on_timeout(key) is called
+    and its slot is freed, so the next job starts on a fresh thread and the pool keeps its capacity.
+    Python threads can't be killed, so the abandoned thread runs on in the background and what it
+    returns is ignored. Jobs return False on failure, and every outcome goes to the circuit breaker.
+    """
+    def __init__(self, workers, timeout, breaker, on_timeout=None):
+        self.slots = threading.Semaphore(workers)
+        self.timeout = timeout
+        self.breaker = breaker
+        self.on_timeout = on_timeout
+        self.lock = threading.Lock()
+        self.running = {}  # key -> start time
+        self.abandoned = 0
+
+    def acquire(self, timeout=None):
+        """Wait for a free worker. Returns False if none became free within timeout seconds."""
+        if timeout == 0:
+            return self.slots.acquire(blocking=False)
+        return self.slots.acquire(timeout=timeout)
+
+    def release(self):
+        """Give back a worker taken with acquire() that wasn't used."""
+        self.slots.release()
+
+    def submit(self, key, function, *args):
+        """Run function(*args) on a new worker thread. Call only after acquire() returned True."""
+        with self.lock:
+            self.running[key] = time.time()
+        threading.Thread(target=self._run, args=(key, function, args), daemon=True).start()
+
+    def _run(self, key, function, args):
+        try:
+            succeeded = function(*args) is not False
+        except Exception as e:
+            print(f"Error in transcription worker for chunk {key}: {e}", flush=True)
+            succeeded = False
+        with self.lock:
+            if self.running.pop(key, None) is None:
+                return  # Abandoned, its slot has already been freed
+        self.slots.release()
+        if succeeded:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure(f"chunk {key} failed")
+
+    def expire_overdue(self):
+        """Abandon jobs that have passed the deadline."""
+        now = time.time()
+        with self.lock:
+            overdue = [key for key, start in self.running.items() if now - start > self.timeout]
+            for key in overdue:
+                del self.running[key]
+        for key in overdue:
+            self.abandoned += 1
+            print(f"Chunk {key} passed the {self.timeout} s transcription deadline, abandoning it", flush=True)
+            self.slots.release()
+            if self.on_timeout:
+                self.on_timeout(key)
+            self.breaker.record_failure(f"chunk {key} timed out")
+
+class ChunkLengthController:
+    """
+    Adapt the capture window to the transcriber's load.
+
+    Every decode has a roughly fixed cost on top of the audio length, so longer chunks are
+    cheaper per second of audio. Decodes that overlap slow each other down, so the load is
+    measured across them: the decode time of the chunks finished over a window of at least one
+    chunk length, divided by the window's wall time and the number of chunks the model can
+    really decode at once. With one model that is 1, and the load is the real-time factor. The window shrinks while the smoothed load
+    is below low_load, for lower latency, and grows when it reaches high_load, so the
+    transcriber keeps up.
+    """
+    def __init__(self, initial, minimum, maximum, low_load=0.3, high_load=0.8, report_every=20):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.seconds = min(max(initial, minimum), maximum)
+        self.low_load = low_load
+        self.high_load = high_load
+        self.report_every = report_every
+        self.workers = 1
+        self.load = None  # Exponentially smoothed share of the workers' time spent decoding
+        self.window_start = None
+        self.busy = 0.0  # Decode seconds finished in the current window
+        self.measurements = 0
+        self.lock = threading.Lock()
+
+    def set_workers(self, workers):
+        """Set the number of chunks the model decodes in parallel (model replicas, not threads)."""
+        with self.lock:
+            self.workers = max(1, workers)
+
+    def record(self, decode_seconds):
+        """Add one finished decode and adjust the window once a measurement window has passed."""
+        now = time.time()
+        with self.lock:
+            # Start over after an idle gap, such as capture being paused
+            if self.window_start is None or now - self.window_start > 4 * self.maximum:
+                self.window_start = now - decode_seconds
+                self.busy = 0.0
+            self.busy += decode_seconds
+            elapsed = now - self.window_start
+            if elapsed < self.seconds:
+                return
+            load = self.busy / (elapsed * self.workers)
+            self.window_start = now
+            self.busy = 0.0
+            self.load = load if self.load is None else 0.7 * self.load + 0.3 * load
+            self.measurements += 1
+            previous = self.seconds
+            if self.load >= self.high_load:
+                self.seconds = min(self.maximum, self.seconds * 1.25)
+            elif self.load < self.low_load:
+                self.seconds = max(self.minimum, self.seconds * 0.9)
+            if abs(self.seconds - previous) >= 0.05 or self.measurements % self.report_every == 0:
+                print(f"Chunk length: {self.seconds:.2f} s, transcriber load: {self.load:.2f}", flush=True)
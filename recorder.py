@@ -1,10 +1,19 @@
-import pyaudiowpatch as pyaudio
 import wave
 import time
 import threading
 import os
+import re
+import collections
+import itertools
 import logging
 import configparser
+import numpy as np
+from audio_processing import EnergyGate, StreamResampler
+from pipeline import WorkQueue, ChunkLengthController
+from metrics import metrics, timeline
+from capture import create_sources, get_audio_devices
+from spool import SegmentSpool
+from ipc import events
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,115 +28,323 @@ SAMPLE_RATE = int(float(config.get('Settings', 'sample_rate', fallback='44100'))
 
 # Constants
 CHUNK = 2048  # Number of frames per buffer
-FORMAT = pyaudio.paInt16  # 16-bit resolution
-CHANNELS = 2  # Stereo
+CHANNELS = 2  # Stereo, captured as 16-bit PCM
 RECORD_SECONDS = 3  # Record in 2-second intervals
 OUTPUT_DIR = "recordings"  # Directory to save recordings
 MAX_FILES = 100  # Maximum number of files to keep
+TARGET_SAMPLE_RATE = 16000  # Sample rate expected by faster-whisper
+AUDIO_QUEUE_SIZE = config.getint('Settings', 'audio_queue_size', fallback=8)  # Maximum chunks waiting for transcription
+QUEUE_POLICY = config.get('Settings', 'queue_policy', fallback='drop-oldest')  # See pipeline.WorkQueue
 
-def get_default_loopback_device(p):
-    """Get the default loopback device."""
-    return p.get_default_wasapi_loopback()
+# Streaming mode: capture short blocks that the transcriber decodes over a sliding window
+STREAMING = config.getboolean('Settings', 'streaming', fallback=False)
+STREAM_STEP_SECONDS = config.getint('Settings', 'stream_step_ms', fallback=500) / 1000
 
-def save_audio(frames, filename):
-    """Save the recorded audio frames to a WAV file."""
-    if not frames:  # Check if frames is empty
+# Hand chunks to the transcriber in memory instead of through WAV files in OUTPUT_DIR.
+# Streaming mode always uses the in-memory handoff.
+IN_MEMORY_AUDIO = STREAMING or config.getboolean('Settings', 'in_memory_audio', fallback=True)
+# Keep the captured audio in a rolling archive (see spool.SegmentSpool)
+ARCHIVE_RECORDINGS = config.getboolean('Settings', 'archive_recordings', fallback=False)
+ARCHIVE_DIR = config.get('Settings', 'archive_dir', fallback='archive')
+ARCHIVE_FORMAT = config.get('Settings', 'archive_format', fallback='flac')  # 'flac' or 'wav'
+ARCHIVE_SEGMENT_MINUTES = config.getfloat('Settings', 'archive_segment_minutes', fallback=10)
+ARCHIVE_MAX_MB = config.getfloat('Settings', 'archive_max_mb', fallback=1024)
+ARCHIVE_MAX_HOURS = config.getfloat('Settings', 'archive_max_hours', fallback=24)
+
+# Adaptive chunk length: adjust RECORD_SECONDS between these bounds from the measured real-time factor
+ADAPTIVE_CHUNK_LENGTH = config.getboolean('Settings', 'adaptive_chunk_length', fallback=False)
+MIN_CHUNK_SECONDS = config.getfloat('Settings', 'min_chunk_seconds', fallback=1.5)
+MAX_CHUNK_SECONDS = config.getfloat('Settings', 'max_chunk_seconds', fallback=8.0)
+
+# Where audio comes from: 'wasapi' (speaker loopback, Windows), 'device' (any input device),
+# 'file' (replay WAV/FLAC files) or 'pcm' (raw 16-bit PCM from stdin or a FIFO). See capture.py.
+CAPTURE_SOURCE = config.get('Settings', 'capture_source', fallback='wasapi')
+CAPTURE_PATH = config.get('Settings', 'capture_path', fallback='')  # File, directory or FIFO; '-' is stdin
+REPLAY_SPEED = config.getfloat('Settings', 'replay_speed', fallback=1.0)  # Multiple of real time, 0 = unpaced
+PCM_SAMPLE_RATE = config.getint('Settings', 'pcm_sample_rate', fallback=16000)
+PCM_CHANNELS = config.getint('Settings', 'pcm_channels', fallback=1)
+# Let the audio driver push blocks into a ring buffer from its own thread, instead of blocking reads
+CAPTURE_CALLBACK = config.getboolean('Settings', 'capture_callback', fallback=True)
+MAX_READ_ERRORS = 5  # Consecutive failed reads before capture gives up
+# More devices to caption at the same time as the selected one, as comma-separated device indexes
+EXTRA_CAPTURE_DEVICES = [int(index) for index in config.get('Settings', 'extra_capture_devices', fallback='').split(',')
+                         if index.strip()]
+
+# Energy gate that drops silent chunks before any file I/O or transcription
+ENERGY_GATE = config.getboolean('Settings', 'energy_gate', fallback=True)
+GATE_OPEN_DB = config.getfloat('Settings', 'gate_open_db', fallback=-50.0)
+GATE_CLOSE_DB = config.getfloat('Settings', 'gate_close_db', fallback=-60.0)
+
+class AudioChunk:
+    """A captured chunk of audio, as 16 kHz mono float32 samples."""
+    def __init__(self, name, audio, capture_time, seq, source=None):
+        self.name = name
+        self.audio = audio
+        self.capture_time = capture_time  # When the chunk's audio ended
+        self.seq = seq  # Capture sequence number, used to deliver captions in order
+        self.source = source  # Label of the capture source when capturing several at once
+
+    @property
+    def duration(self):
+        """Length of the chunk in seconds."""
+        return len(self.audio) / TARGET_SAMPLE_RATE
+
+    @property
+    def start_time(self):
+        """When the chunk's audio started."""
+        return self.capture_time - self.duration
+
+def save_audio(audio, filename, seq=None):
+    """Save 16 kHz mono float32 audio to a 16-bit WAV file."""
+    if audio.size == 0:  # Check if there is any audio
         print(f"Warning: No audio data to save for {filename}")
         return
+    metrics.mark(seq, "save_start")
     with wave.open(filename, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(pyaudio.PyAudio().get_sample_size(FORMAT))
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes(b''.join(frames))
-
-def cleanup_old_files():
-    """Delete old WAV files, keeping only the most recent MAX_FILES."""
-    files = [f for f in os.listdir(OUTPUT_DIR) if f.endswith('.wav')]
-    files.sort(key=lambda x: os.path.getmtime(os.path.join(OUTPUT_DIR, x)), reverse=True)
-    
-    for old_file in files[MAX_FILES:]:
-        os.remove(os.path.join(OUTPUT_DIR, old_file))
-        print(f"Deleted old file: {old_file}")
-
-def get_audio_devices():
-    """Get all available WASAPI loopback devices."""
-    devices = []
-    try:
-        p = pyaudio.PyAudio()
-        wasapi_info = p.get_host_api_info_by_type(pyaudio.paWASAPI)
-        
-        for i in range(p.get_device_count()):
-            device_info = p.get_device_info_by_index(i)
-            # Check if the device is a loopback device
-            if device_info.get('hostApi') == wasapi_info['index'] and device_info.get('isLoopbackDevice', False):
-                devices.append({
-                    'index': i,
-                    'name': device_info.get('name', 'Unknown Device'),
-                    'defaultSampleRate': device_info.get('defaultSampleRate', 44100),
-                    'maxInputChannels': device_info.get('maxInputChannels', 2)
-                })
-                logger.info(f"Found loopback audio device: {device_info.get('name')} (Index: {i})")
-        
-        p.terminate()
-    except Exception as e:
-        logger.error(f"Error getting audio devices: {e}")
-    return devices
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(TARGET_SAMPLE_RATE)
+        wf.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+    metrics.mark(seq, "saved")
+
+def merge_chunks(chunks):
+    """
+    Merge adjacent chunks into one longer chunk, keeping the first chunk's name and sequence number
+    and the last chunk's capture time, so the merged audio still ends at capture_time.
+    """
+    first = chunks[0]
+    return AudioChunk(first.name, np.concatenate([c.audio for c in chunks]), chunks[-1].capture_time, first.seq,
+                      first.source)
+
+# Chunk length chosen from the transcriber's decode timings, or None for fixed RECORD_SECONDS chunks
+chunk_length = (ChunkLengthController(RECORD_SECONDS, MIN_CHUNK_SECONDS, MAX_CHUNK_SECONDS)
+                if ADAPTIVE_CHUNK_LENGTH and not STREAMING else None)
+
+# Capture runs while this is set; cleared to pause capture without closing the process
+capture_enabled = threading.Event()
+capture_enabled.set()
+
+def create_audio_queue():
+    """Create a queue of AudioChunk objects waiting for transcription."""
+    return WorkQueue(AUDIO_QUEUE_SIZE, QUEUE_POLICY, merge=merge_chunks, on_shed=metrics.shed)
+
+# Queue of AudioChunk objects consumed by transcriber.monitor_audio_queue/monitor_audio_stream
+audio_queue = create_audio_queue()
+
+# Queue per source label when capturing several sources at once, consumed by transcriber.monitor_sources
+source_queues = {}
+
+# Capture sequence numbers, shared by all sources so every chunk has its own
+chunk_numbers = itertools.count()
+
+def enqueue_chunk(chunk, work_queue=None):
+    """Put a chunk on the audio queue. The queue policy decides what to shed when it is full."""
+    metrics.mark(chunk.seq, "queued")
+    (work_queue or audio_queue).put(chunk)
+
+def clear_audio_queues():
+    """Discard the chunks waiting in every audio queue."""
+    for work_queue in [audio_queue, *source_queues.values()]:
+        work_queue.clear()
 
-def record_audio(device_index=None):
-    """Record audio from the specified or default speaker and save it to a file."""
+# Archives of the captured audio by source label (None for the only source), opened when capture
+# starts if enabled. Importing the recorder (the launcher, the benchmark, replica processes) must
+# not start a spool on the same directory.
+archives = {}
+archive_lock = threading.Lock()
+
+def open_archive(label=None, sources=1):
+    """
+    Open the audio archive of a source if it is enabled and not open yet, and return it (or None).
+
+    Each labelled source gets its own spool in a subdirectory of ARCHIVE_DIR, so devices captured
+    at the same time aren't interleaved in one file. The size budget is split between sources.
+    """
+    with archive_lock:
+        if label not in archives and ARCHIVE_RECORDINGS:
+            directory = ARCHIVE_DIR
+            if label is not None:
+                directory = os.path.join(ARCHIVE_DIR, re.sub(r'[^\w-]+', '_', label).strip('_'))
+            archives[label] = SegmentSpool(directory, TARGET_SAMPLE_RATE, ARCHIVE_FORMAT,
+                                           ARCHIVE_SEGMENT_MINUTES * 60,
+                                           int(ARCHIVE_MAX_MB * 1024 * 1024 / sources), ARCHIVE_MAX_HOURS * 3600)
+        return archives.get(label)
+
+# WAV files written for the transcriber, oldest first
+saved_files = collections.deque()
+
+def retire_old_files(filename):
+    """Remember a WAV file written for the transcriber and delete the oldest beyond MAX_FILES."""
+    saved_files.append(filename)
+    while len(saved_files) > MAX_FILES:
+        old_file = saved_files.popleft()
+        try:
+            os.remove(old_file)
+        except FileNotFoundError:
+            pass
+
+def run_capture(read_block, sample_rate, channels, pause_stream=None, resume_stream=None, work_queue=None,
+                source=None):
+    """
+    Turn a stream of captured PCM blocks into chunks for the transcriber.
+
+    Each block is downmixed and resampled as it arrives. Finished chunks go through the energy
+    gate and are queued for transcription or written to OUTPUT_DIR, and archived if enabled.
+
+    Args:
+        read_block (callable): Returns the next block of interleaved 16-bit PCM (CHUNK frames) as
+            bytes or a memoryview, or None at the end of the stream.
+        sample_rate (int): Sample rate of the captured audio.
+        channels (int): Number of interleaved channels.
+        pause_stream (callable): Called when capture is paused.
+        resume_stream (callable): Called when capture is resumed.
+        work_queue (WorkQueue): Queue for the chunks. Defaults to audio_queue.
+        source (str): Label of the capture source, when capturing several at once.
+
+    Raises:
+        Exception: The last read error, after MAX_READ_ERRORS reads in a row have failed.
+    """
+    gate = EnergyGate(GATE_OPEN_DB, GATE_CLOSE_DB) if ENERGY_GATE else None
+    archive = archives.get(source)
+    # Downmix and resample each read as it arrives, keeping filter state between reads
+    resampler = StreamResampler(sample_rate, TARGET_SAMPLE_RATE, channels)
+    end_of_stream = False
+    read_errors = 0
+    while not end_of_stream:
+        if not capture_enabled.is_set():
+            if pause_stream:
+                pause_stream()
+            logger.info("Audio capture paused")
+            capture_enabled.wait()
+            if resume_stream:
+                resume_stream()
+            logger.info("Audio capture resumed")
+        if STREAMING:
+            chunk_seconds = STREAM_STEP_SECONDS
+        else:
+            chunk_seconds = chunk_length.seconds if chunk_length else RECORD_SECONDS
+        blocks = []
+        chunk_start = time.time()
+        expected_blocks = max(1, int(sample_rate / CHUNK * chunk_seconds))
+        for _ in range(expected_blocks):
+            if not capture_enabled.is_set():
+                break
+            try:
+                data = read_block()
+            except Exception as e:
+                read_errors += 1
+                metrics.count("capture_read_errors")
+                logger.error(f"Error reading audio block ({read_errors} in a row): {e}")
+                if read_errors >= MAX_READ_ERRORS:
+                    raise
+                continue
+            read_errors = 0
+            if data is None:
+                end_of_stream = True
+                break
+            # The block may be a view into the capture ring buffer, so it is consumed right away
+            blocks.append(resampler.process(data))
+
+        if not capture_enabled.is_set():
+            continue  # Paused mid-chunk, drop the partial chunk
+        if blocks:  # Only save if we have captured frames
+            audio = np.concatenate(blocks)
+            if len(blocks) < expected_blocks and not end_of_stream:
+                # Some reads failed, so the chunk is missing audio
+                logger.warning(f"Chunk is short: {len(blocks)} of {expected_blocks} blocks captured")
+                metrics.count("chunks_short")
+            if gate and not gate.process(audio, len(audio) / TARGET_SAMPLE_RATE):
+                metrics.count("chunks_skipped")
+                continue
+            capture_time = time.time()
+            seq = next(chunk_numbers)
+            # The sequence number keeps names unique and in capture order within the same second
+            name = f"recording_{int(capture_time)}_{seq:06d}"
+            metrics.start_chunk(seq, name, chunk_start, capture_time, source)
+            if IN_MEMORY_AUDIO:
+                enqueue_chunk(AudioChunk(name, audio, capture_time, seq, source), work_queue)
+            if archive:
+                archive.append(seq, capture_time, audio)
+            if not IN_MEMORY_AUDIO:
+                filename = os.path.join(OUTPUT_DIR, name + ".wav")
+                threading.Thread(target=save_audio, args=(audio, filename, seq)).start()
+                retire_old_files(filename)
+        elif not end_of_stream:
+            logger.warning("No frames captured in this segment")
+
+def record_audio(device_index=None, source=None, source_path=None, speed=None, work_queue=None, label=None):
+    """
+    Record audio from the capture source and hand it to the transcriber.
+
+    Args:
+        device_index (int): Device to capture from. Defaults to the system default.
+        source (str): Capture source, see capture.create_sources. Defaults to capture_source in config.ini.
+        source_path (str): File, directory or FIFO to read for the 'file' and 'pcm' sources.
+        speed (float): Replay speed for the 'file' source.
+        work_queue (WorkQueue): Queue for the chunks. Defaults to audio_queue.
+        label (str): Label of the source, when capturing several at once.
+    """
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
         logger.info(f"Created output directory: {OUTPUT_DIR}")
+    if not IN_MEMORY_AUDIO and not saved_files:
+        # Recordings left by an earlier run count towards MAX_FILES; names sort in capture order
+        saved_files.extend(os.path.join(OUTPUT_DIR, f) for f in sorted(os.listdir(OUTPUT_DIR)) if f.endswith('.wav'))
 
-    try:
-        with pyaudio.PyAudio() as p:
-            # Get the specified or default loopback device
-            if device_index is not None:
-                device_info = p.get_device_info_by_index(device_index)
-                logger.info(f"Using selected device: {device_info.get('name')} (Index: {device_index})")
-            else:
-                device_info = get_default_loopback_device(p)
-                device_index = device_info['index']
-                logger.info(f"Using default loopback device: {device_info.get('name')} (Index: {device_index})")
-
-            # Log device properties
-            logger.info(f"Device properties: {device_info}")
-            
-            try:
-                # Open the stream with the detected sample rate
-                stream = p.open(format=FORMAT,
-                                channels=CHANNELS,
-                                rate=SAMPLE_RATE,
-                                input=True,
-                                frames_per_buffer=CHUNK,
-                                input_device_index=device_index)
-                
-                logger.info("Audio stream opened successfully")
-                
-                while True:
-                    frames = []
-                    for _ in range(0, int(SAMPLE_RATE / CHUNK * RECORD_SECONDS)):
-                        try:
-                            data = stream.read(CHUNK)
-                            frames.append(data)
-                        except Exception as e:
-                            logger.error(f"Error reading audio chunk: {e}")
-                            continue
-
-                    if frames:  # Only save if we have captured frames
-                        filename = os.path.join(OUTPUT_DIR, f"recording_{int(time.time())}.wav")
-                        threading.Thread(target=save_audio, args=(frames, filename)).start()
-                        cleanup_old_files()
-                    else:
-                        logger.warning("No frames captured in this segment")
+    open_archive(label)
+    source = source or CAPTURE_SOURCE
+    if source == "pcm":
+        sample_rate, channels = PCM_SAMPLE_RATE, PCM_CHANNELS
+    else:
+        sample_rate, channels = SAMPLE_RATE, CHANNELS
+    sources = create_sources(source, source_path or CAPTURE_PATH, device_index, sample_rate, channels,
+                             REPLAY_SPEED if speed is None else speed, CHUNK, CAPTURE_CALLBACK)
+    for audio_source in sources:
+        try:
+            audio_source.open()
+            logger.info("Audio stream opened successfully")
+            timeline.mark("audio device opened")
+        except Exception as e:
+            logger.error(f"Error opening audio stream: {e}")
+            raise
+        try:
+            run_capture(audio_source.read, audio_source.sample_rate, audio_source.channels,
+                        audio_source.pause, audio_source.resume, work_queue, label)
+        except Exception as e:
+            logger.error(f"Critical error in record_audio: {e}")
+            raise
+        finally:
+            audio_source.close()
+    logger.info("Capture source finished")
 
-            except Exception as e:
-                logger.error(f"Error opening audio stream: {e}")
-                raise
+def record_sources(devices, source=None):
+    """
+    Capture several devices at once, each on its own thread into its queue in source_queues.
 
+    Args:
+        devices (dict): Source label -> device index.
+        source (str): Capture source for all devices, 'wasapi' or 'device'.
+    """
+    threads = []
+    for label, device_index in devices.items():
+        source_queues.setdefault(label, create_audio_queue())
+        open_archive(label, len(devices))
+        thread = threading.Thread(target=record_source, args=(label, device_index, source), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+def record_source(label, device_index, source=None):
+    """
+    Capture one of several devices, reporting a failure under its label. The other devices keep
+    capturing.
+    """
+    try:
+        record_audio(device_index, source, work_queue=source_queues[label], label=label)
     except Exception as e:
-        logger.error(f"Critical error in record_audio: {e}")
-        raise
+        logger.error(f"Audio capture stopped for {label}: {e}")
+        events.emit("error", message=f"Audio capture stopped for {label}: {e}")
 
 if __name__ == "__main__":
     record_audio()
@@ -0,0 +1,233 @@
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+import numpy as np
+import psutil
+from metrics import metrics
+
+MEMORY_REPORT_INTERVAL = 30.0  # Seconds between updates of the per-replica memory gauges
+
+class ReplicaWord:
+    """Picklable copy of a faster-whisper Word."""
+    def __init__(self, word):
+        self.start = word.start
+        self.end = word.end
+        self.word = word.word
+        self.probability = word.probability
+
+class ReplicaSegment:
+    """Picklable copy of the faster-whisper Segment fields the transcriber uses."""
+    def __init__(self, segment):
+        self.start = segment.start
+        self.end = segment.end
+        self.text = segment.text
+        self.avg_logprob = segment.avg_logprob
+        self.no_speech_prob = segment.no_speech_prob
+        self.words = [ReplicaWord(word) for word in segment.words] if segment.words else None
+
+class ReplicaInfo:
+    """Picklable copy of the faster-whisper TranscriptionInfo fields the transcriber uses."""
+    def __init__(self, info):
+        self.language = info.language
+        self.language_probability = info.language_probability
+        self.duration = info.duration
+
+def replica_main(conn, model_size, cpu_threads, warm_up):
+    """
+    Entry point of a replica process: load a model, then answer (audio, kwargs) transcribe requests
+    with ("ok", segments, info) or ("error", message) until the pipe closes.
+    """
+    try:
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_size, device="cpu", cpu_threads=cpu_threads)
+        if warm_up:
+            segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1, language="en")
+            list(segments)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        audio, kwargs = request
+        try:
+            segments, info = model.transcribe(audio, **kwargs)
+            conn.send(("ok", [ReplicaSegment(segment) for segment in segments], ReplicaInfo(info)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+class Replica:
+    """One model replica process and the pipe to it."""
+    def __init__(self, number):
+        self.number = number
+        self.process = None
+        self.conn = None
+        self.pending = 0  # Chunks waiting for or running on this replica
+        self.ready = False
+        self.lock = threading.Lock()  # Held for a whole request, since the replica decodes one chunk at a time
+
+class ReplicaPool:
+    """
+    Model replicas in worker processes for CPU transcription, usable in place of a WhisperModel.
+
+    Each of the `replicas` processes loads its own model with cpu_threads // replicas CTranslate2
+    threads, so together they keep to the same thread budget as a single model, but decode in
+    parallel instead of contending for the GIL in one process. transcribe() sends the chunk to the
+    ready replica with the fewest chunks waiting or running and blocks until it answers, so the
+    transcriber's worker threads work unchanged. A replica that doesn't answer within timeout
+    seconds is killed and restarted in the background.
+    """
+    def __init__(self, model_size, replicas, cpu_threads=0, timeout=None, warm_up=True):
+        self.model_size = model_size
+        # CTranslate2 would use 4 threads per model by default; split the physical cores instead
+        budget = cpu_threads or psutil.cpu_count(logical=False) or os.cpu_count() or replicas
+        self.threads_per_replica = max(1, budget // replicas)
+        self.timeout = timeout
+        self.warm_up = warm_up
+        self.context = multiprocessing.get_context("spawn")
+        self.condition = threading.Condition()
+        self.replicas = [Replica(number) for number in range(replicas)]
+        print(f"Starting {replicas} model replicas with {self.threads_per_replica} threads each", flush=True)
+        # Load the replicas in parallel, then wait for all of them
+        for replica in self.replicas:
+            self._spawn(replica)
+        for replica in self.replicas:
+            self._wait_ready(replica)
+        self.report_memory(log=True)
+        # Stop the processes once the pool is no longer used, e.g. after a model swap
+        self.finalizer = weakref.finalize(self, stop_replicas, self.replicas)
+        threading.Thread(target=self._report_memory_periodically, args=(weakref.ref(self),), daemon=True).start()
+
+    def transcribe(self, audio, **kwargs):
+        """Transcribe on the least loaded replica. Returns (segments, info) like WhisperModel.transcribe."""
+        while True:
+            replica = self._acquire()
+            try:
+                with replica.lock:
+                    # The replica may have been restarted while this chunk waited for it; pick another
+                    if replica.ready:
+                        reply = self._request(replica, audio, kwargs)
+                        break
+            finally:
+                with self.condition:
+                    replica.pending -= 1
+                    self.condition.notify_all()
+        if reply[0] == "error":
+            raise RuntimeError(reply[1])
+        _, segments, info = reply
+        return iter(segments), info
+
+    def _request(self, replica, audio, kwargs):
+        replica.conn.send((audio, kwargs))
+        if not replica.conn.poll(self.timeout):
+            self._restart(replica, f"no answer after {self.timeout} s")
+            raise TimeoutError(f"Model replica {replica.number} didn't answer within {self.timeout} s")
+        try:
+            return replica.conn.recv()
+        except (EOFError, OSError) as e:
+            self._restart(replica, f"pipe closed: {e}")
+            raise RuntimeError(f"Model replica {replica.number} exited") from e
+
+    def memory_mb(self):
+        """Return each running replica's resident memory in MB, by replica number."""
+        memory = {}
+        for replica in self.replicas:
+            try:
+                memory[replica.number] = psutil.Process(replica.process.pid).memory_info().rss / (1024 * 1024)
+            except (psutil.Error, AttributeError):
+                continue
+        return memory
+
+    def report_memory(self, log=False):
+        """Update the per-replica memory gauges, and print them if log is set."""
+        memory = self.memory_mb()
+        for number, mb in memory.items():
+            metrics.set_gauge("replica_rss_bytes", int(mb * 1024 * 1024), "replica", number)
+        if log:
+            print("Replica memory: " + ", ".join(f"{number}: {mb:.0f} MB" for number, mb in memory.items()),
+                  flush=True)
+
+    def close(self):
+        """Stop the replica processes."""
+        self.finalizer()
+
+    def _acquire(self):
+        with self.condition:
+            while True:
+                ready = [replica for replica in self.replicas if replica.ready]
+                if ready:
+                    replica = min(ready, key=lambda r: r.pending)
+                    replica.pending += 1
+                    return replica
+                if not self.condition.wait(self.timeout):
+                    raise RuntimeError("No model replica is running")
+
+    def _spawn(self, replica):
+        parent_conn, child_conn = self.context.Pipe()
+        replica.conn = parent_conn
+        replica.process = self.context.Process(
+            target=replica_main, args=(child_conn, self.model_size, self.threads_per_replica, self.warm_up),
+            name=f"ModelReplica-{replica.number}", daemon=True)
+        replica.process.start()
+        child_conn.close()
+
+    def _wait_ready(self, replica):
+        try:
+            reply = replica.conn.recv()
+        except (EOFError, OSError):
+            replica.process.join(1.0)
+            reply = ("error", f"exited with code {replica.process.exitcode}")
+        if reply[0] != "ready":
+            raise RuntimeError(f"Model replica {replica.number} failed to load: {reply[1]}")
+        with self.condition:
+            replica.ready = True
+            self.condition.notify_all()
+
+    def _restart(self, replica, reason):
+        """Kill a stuck or crashed replica and load a new one in the background."""
+        print(f"Restarting model replica {replica.number}: {reason}", flush=True)
+        metrics.count("replica_restarts")
+        with self.condition:
+            replica.ready = False
+        replica.process.kill()
+        replica.conn.close()
+        threading.Thread(target=self._respawn, args=(replica,), daemon=True).start()
+
+    def _respawn(self, replica):
+        with replica.lock:
+            self._spawn(replica)
+            try:
+                self._wait_ready(replica)
+            except RuntimeError as e:
+                print(e, flush=True)
+
+    @staticmethod
+    def _report_memory_periodically(pool_ref):
+        while True:
+            time.sleep(MEMORY_REPORT_INTERVAL)
+            pool = pool_ref()
+            if pool is None:
+                return
+            pool.report_memory()
+            del pool
+
+def stop_replicas(replicas):
+    """Ask the replica processes to exit, killing any that don't."""
+    for replica in replicas:
+        try:
+            replica.conn.send(None)
+        except (OSError, ValueError, AttributeError):
+            pass
+    for replica in replicas:
+        if replica.process is None:
+            continue
+        replica.process.join(2.0)
+        if replica.process.is_alive():
+            replica.process.kill()
@@ -0,0 +1,217 @@
+import collections
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import numpy as np
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("wav", "flac")
+# One index record per chunk: sequence number, capture time, first frame in the part, frame count
+INDEX_RECORD = struct.Struct("<IdQI")
+
+class IndexEntry:
+    """Where a chunk is in a spool part."""
+    def __init__(self, seq, capture_time, offset, frames):
+        self.seq = seq
+        self.capture_time = capture_time
+        self.offset = offset
+        self.frames = frames
+
+class SpoolPart:
+    """A closed part of the spool on disk."""
+    def __init__(self, path, size, end_time, seqs=()):
+        self.path = path
+        self.size = size  # Bytes of audio and index together
+        self.end_time = end_time  # Capture time of the last chunk
+        self.seqs = list(seqs)  # Chunks of the current session in this part
+
+class SegmentSpool:
+    """
+    Archive of captured chunks, appended to one rolling audio file per session.
+
+    A background thread appends the chunks to session_<start time>_<part>.wav (or .flac). Each part
+    has a .idx file of fixed-size records giving every chunk's sequence number, capture time and
+    frame offset, so chunks can be found and read back without decoding the whole part. A new part
+    is started every segment_seconds of audio. Once the spool is over max_bytes, or its oldest part
+    is more than max_age seconds old, whole parts are deleted oldest first. Parts are kept in order
+    with a running byte total, so retention never lists or stats the directory.
+    """
+    def __init__(self, directory, sample_rate=16000, format="flac", segment_seconds=600,
+                 max_bytes=1 << 30, max_age=24 * 3600):
+        if format not in FORMATS:
+            logger.warning(f"Unknown archive format '{format}', using wav")
+            format = "wav"
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.format = format
+        self.segment_frames = int(segment_seconds * sample_rate)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.parts = collections.deque()  # Closed parts, oldest first
+        self.total_bytes = 0  # Size of the closed parts
+        self.index = {}  # seq -> (part path, IndexEntry) for the current session's chunks
+        self.session = None
+        self.part_number = 0
+        self.path = None
+        self.raw_file = None
+        self.file = None
+        self.index_file = None
+        self.frames = 0
+        self.seqs = []
+        self.last_capture_time = None
+        self.writes = queue.Queue()
+        self.load_existing()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def load_existing(self):
+        """Add the parts left by earlier runs to the retention budget. Only done once, at startup."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            path, extension = os.path.splitext(os.path.join(self.directory, name))
+            if extension != ".idx" or not any(os.path.exists(path + "." + f) for f in FORMATS):
+                continue
+            audio_path = next(path + "." + f for f in FORMATS if os.path.exists(path + "." + f))
+            entries = read_index(path + ".idx")
+            end_time = entries[-1].capture_time if entries else os.path.getmtime(audio_path)
+            part = SpoolPart(audio_path, os.path.getsize(audio_path) + os.path.getsize(path + ".idx"), end_time)
+            self.parts.append(part)
+            self.total_bytes += part.size
+        self.enforce_budget()
+
+    def start_session(self):
+        """Start a new session file with the next chunk."""
+        self.writes.put(("session", None))
+
+    def append(self, seq, capture_time, audio):
+        """
+        Queue a chunk to be appended to the current part.
+
+        Args:
+            seq (int): Capture sequence number of the chunk.
+            capture_time (float): Time the chunk was captured.
+            audio (np.ndarray): 16-bit PCM or float32 samples in [-1, 1] at sample_rate.
+        """
+        self.writes.put(("chunk", (seq, capture_time, audio)))
+
+    def read(self, seq):
+        """
+        Read a chunk of the current session back.
+
+        Returns:
+            np.ndarray: The chunk as float32 samples, or None if it is not (or no longer) in the spool.
+        """
+        import soundfile as sf
+        with self.lock:
+            if seq not in self.index:
+                return None
+            path, entry = self.index[seq]
+            if path == self.path and self.file is not None:
+                # An unfinished FLAC file can't be read back, so finish the part and start the next one
+                self._close_part()
+            with sf.SoundFile(path) as part:
+                part.seek(entry.offset)
+                return part.read(entry.frames, dtype='float32')
+
+    def close(self, timeout=5.0):
+        """Write the queued chunks and close the current part."""
+        self.writes.put(("close", None))
+        self.thread.join(timeout)
+
+    def _write_loop(self):
+        while True:
+            kind, item = self.writes.get()
+            try:
+                if kind == "chunk":
+                    self._write_chunk(*item)
+                elif kind == "session":
+                    with self.lock:
+                        self._close_part()
+                        self.session = None
+                else:
+                    with self.lock:
+                        self._close_part()
+                    return
+            except Exception as e:
+                logger.error(f"Error writing to the audio archive: {e}")
+                metrics.count("archive_errors")
+
+    def _write_chunk(self, seq, capture_time, audio):
+        metrics.mark(seq, "save_start")
+        if audio.dtype != np.int16:
+            audio = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        with self.lock:
+            if self.file is None:
+                self._open_part(capture_time)
+            self.file.write(audio)
+            self.index_file.write(INDEX_RECORD.pack(seq, capture_time, self.frames, len(audio)))
+            self.index_file.flush()
+            self.index[seq] = (self.path, IndexEntry(seq, capture_time, self.frames, len(audio)))
+            self.seqs.append(seq)
+            self.frames += len(audio)
+            self.last_capture_time = capture_time
+            # Roll over on length, or early if one part would take up much of the budget
+            if self.frames >= self.segment_frames or self.raw_file.tell() >= self.max_bytes // 4:
+                self._close_part()
+            self.enforce_budget()
+        metrics.mark(seq, "saved")
+
+    def _open_part(self, capture_time):
+        import soundfile as sf
+        os.makedirs(self.directory, exist_ok=True)
+        if self.session is None:
+            self.session = f"session_{int(capture_time)}"
+            self.part_number = 0
+            self.index = {}
+        base = os.path.join(self.directory, f"{self.session}_{self.part_number:03d}")
+        self.part_number += 1
+        self.path = base + "." + self.format
+        self.raw_file = open(self.path, "w+b")
+        self.file = sf.SoundFile(self.raw_file, "w", self.sample_rate, 1, subtype="PCM_16",
+                                 format=self.format.upper())
+        self.index_file = open(base + ".idx", "wb")
+        self.frames = 0
+        self.seqs = []
+
+    def _close_part(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.raw_file.close()
+        self.index_file.close()
+        size = os.path.getsize(self.path) + os.path.getsize(os.path.splitext(self.path)[0] + ".idx")
+        self.parts.append(SpoolPart(self.path, size, self.last_capture_time, self.seqs))
+        self.total_bytes += size
+        self.file = self.raw_file = self.index_file = None
+
+    def enforce_budget(self):
+        """Delete the oldest parts while the spool is over its size or age budget."""
+        current = self.raw_file.tell() if self.raw_file else 0
+        while self.parts and (self.total_bytes + current > self.max_bytes or
+                              self.parts[0].end_time < time.time() - self.max_age):
+            part = self.parts.popleft()
+            self.total_bytes -= part.size
+            for seq in part.seqs:
+                if self.index.get(seq, (None,))[0] == part.path:
+                    del self.index[seq]
+            for path in (part.path, os.path.splitext(part.path)[0] + ".idx"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            logger.info(f"Deleted old archive part: {os.path.basename(part.path)}")
+
+def read_index(path):
+    """Read the IndexEntry records of a spool part's .idx file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    # A crash can leave a partial record at the end
+    data = data[:len(data) - len(data) % INDEX_RECORD.size]
+    return [IndexEntry(*record) for record in INDEX_RECORD.iter_unpack(data)]
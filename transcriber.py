@@ -1,11 +1,21 @@
 import time
 import os
 import configparser
-from faster_whisper import WhisperModel
 import queue  # New import
-from gui import SubtitleGUI  # New import
+from gui import SubtitleGUI, Caption  # New import
 import soundfile as sf
-import concurrent.futures
+import threading
+import subprocess
+import gc
+import numpy as np
+import psutil
+import re
+from pipeline import (ReorderBuffer, BatchScheduler, WorkQueue, CircuitBreaker, WorkerPool, NotifyingQueue,
+                      FairScheduler)
+from metrics import metrics, timeline
+from ipc import events
+from transcript import ChunkTranscript, TranscriptWriter
+from replicas import ReplicaPool
 
 # Constants
 AUDIO_INPUT_DIR = "recordings"
@@ -14,60 +24,476 @@ TRANSCRIPTION_OUTPUT = "transcriptions.txt"
 # Load configuration
 config = configparser.ConfigParser()
 config.read("config.ini")
-MODEL_SIZE = config.get('Settings', 'model')
+MODEL_SIZE = config.get('Settings', 'model', fallback='small')
+WARM_UP_MODEL = config.getboolean('Settings', 'warm_up_model', fallback=True)  # Run a dummy decode after loading
 
-# Queue for GUI updates
-transcription_queue = queue.Queue()
+# Approximate memory in MB a loaded model needs, used to refuse hot swaps that won't fit
+MODEL_MEMORY_MB = {'tiny': 400, 'base': 600, 'small': 1200, 'medium': 2800, 'large': 5000}
+SWAP_MEMORY_MARGIN = 1.2  # Require this much more free memory than the estimate
 
-def initialize_model(device):
+# Parallel transcription settings
+TRANSCRIPTION_WORKERS = config.getint('Settings', 'transcription_workers', fallback=4)
+REORDER_DEADLINE = config.getfloat('Settings', 'reorder_deadline', fallback=6.0)  # Seconds to wait for a slow chunk
+LATE_CAPTIONS = config.get('Settings', 'late_captions', fallback='mark')  # 'mark' or 'skip'
+QUEUE_SIZE = config.getint('Settings', 'audio_queue_size', fallback=8)  # Maximum recordings waiting for transcription
+QUEUE_POLICY = config.get('Settings', 'queue_policy', fallback='drop-oldest')  # See pipeline.WorkQueue
+
+# CPU mode: run this many model replicas in worker processes (see replicas.ReplicaPool), 1 = one in-process model
+CPU_REPLICAS = config.getint('Settings', 'cpu_replicas', fallback=1)
+CPU_THREADS = config.getint('Settings', 'cpu_threads', fallback=0)  # CTranslate2 threads, split between replicas
+
+# Transcript file format: txt, srt, vtt or jsonl (see transcript.TranscriptWriter)
+TRANSCRIPT_FORMAT = config.get('Settings', 'transcript_format', fallback='txt')
+
+# Per-chunk deadline: a decode that takes longer is abandoned while the model stays loaded
+CHUNK_TIMEOUT = config.getfloat('Settings', 'chunk_timeout', fallback=10.0)
+ABANDON_GRACE = 2.0  # Seconds past the deadline before a worker that hasn't stopped on its own is abandoned
+FAILURES_BEFORE_RESTART = config.getint('Settings', 'failures_before_restart', fallback=3)  # Failed chunks in a row
+
+# Batched inference settings (in-memory audio only)
+BATCHED_INFERENCE = config.getboolean('Settings', 'batched_inference', fallback=False)
+MAX_BATCH_SIZE = config.getint('Settings', 'max_batch_size', fallback=8)
+BATCH_MAX_WAIT = config.getint('Settings', 'batch_max_wait_ms', fallback=50) / 1000
+
+# Streaming mode settings
+SAMPLE_RATE = 16000  # Sample rate of in-memory audio chunks
+STREAM_MAX_WINDOW = config.getfloat('Settings', 'stream_max_window', fallback=15.0)  # Seconds of audio re-decoded at most
+STREAM_PROMPT_CHARS = 200  # Committed text passed back to the model as context
+STREAM_MAX_GAP = 2.0  # Seconds between blocks (skipped silence, paused capture) that end the current window
+
+# Default latency target when captioning several sources at once: seconds from capture within which a
+# source's chunks should start decoding. The scheduler serves the chunk that is due first.
+SOURCE_LATENCY_TARGET = config.getfloat('Settings', 'source_latency_target', fallback=4.0)
+
+# Language: a fixed language code such as 'en', or empty to detect it and pin it once detection agrees
+LANGUAGE = config.get('Settings', 'language', fallback='').strip() or None
+LANGUAGE_PIN_AFTER = config.getint('Settings', 'language_pin_after', fallback=3)  # Confident detections in a row
+LANGUAGE_MIN_PROBABILITY = config.getfloat('Settings', 'language_min_probability', fallback=0.8)
+LANGUAGE_REPROBE_CHUNKS = config.getint('Settings', 'language_reprobe_chunks', fallback=50)  # 0 = never re-probe
+LANGUAGE_MIN_LOGPROB = -1.0  # Pinned decodes scoring below this average log probability trigger a re-probe
+
+# Queue for GUI updates, which wakes the GUI when captions arrive
+transcription_queue = NotifyingQueue()
+
+class ChunkTimeout(Exception):
+    """Raised when decoding a chunk runs past its deadline."""
+
+def request_restart(reason):
+    """Ask the launcher for a full restart after repeated transcription failures."""
+    print(f"Transcription keeps failing (last: {reason}), requesting a restart", flush=True)
+    events.emit("restart_required", reason=reason)
+
+# Escalates to a restart only when chunks fail or time out repeatedly
+breaker = CircuitBreaker(FAILURES_BEFORE_RESTART, on_trip=request_restart)
+
+# Keeps the transcript file open and writes captions to it in batches
+transcript_writer = TranscriptWriter(TRANSCRIPT_FORMAT)
+# Transcript writers of the labelled sources when captioning several at once
+source_writers = {}
+
+def writer_for(source):
+    """Return the transcript writer for a source label, None being the only or main source."""
+    if source is None:
+        return transcript_writer
+    if source not in source_writers:
+        source_writers[source] = TranscriptWriter(TRANSCRIPT_FORMAT)
+    return source_writers[source]
+
+def source_output_path(output_path, source):
+    """Return the transcript path for a source label: the output path with the label appended."""
+    if source is None:
+        return output_path
+    base, extension = os.path.splitext(output_path)
+    label = re.sub(r'[^\w-]+', '_', source).strip('_')
+    return f"{base}_{label}{extension}"
+
+def start_transcripts(output_path, sources=()):
+    """
+    Start a new transcript for every source. sources gives the labels of the sources being
+    captioned, so their writers exist and truncate their files before the first caption.
+    """
+    for source in sources:
+        writer_for(source)
+    transcript_writer.start_session(output_path)
+    for source, writer in source_writers.items():
+        writer.start_session(source_output_path(output_path, source))
+
+def close_transcripts():
+    """Write out and close every source's transcript."""
+    for writer in [transcript_writer, *source_writers.values()]:
+        writer.close()
+
+class LanguageTracker:
+    """
+    Pins the transcription language once detection is consistent, so chunks skip language detection.
+
+    Until a language is pinned every decode detects it. After pin_after detections in a row of the
+    same language with at least min_probability, that language is passed to the model. Every
+    reprobe_chunks chunks, or after a pinned decode scores below LANGUAGE_MIN_LOGPROB, one chunk
+    detects the language again; a confident detection of a different language unpins it.
+    """
+    def __init__(self, language=None, pin_after=3, min_probability=0.8, reprobe_chunks=50):
+        self.fixed = language is not None
+        self.pinned = language
+        self.pin_after = pin_after
+        self.min_probability = min_probability
+        self.reprobe_chunks = reprobe_chunks
+        self.candidate = None
+        self.streak = 0
+        self.chunks_until_probe = reprobe_chunks
+        self.lock = threading.Lock()
+
+    def next_language(self):
+        """Return the language to decode the next chunk with, or None to detect it."""
+        with self.lock:
+            if self.fixed or self.pinned is None:
+                return self.pinned
+            if self.reprobe_chunks <= 0:
+                return self.pinned
+            self.chunks_until_probe -= 1
+            if self.chunks_until_probe > 0:
+                return self.pinned
+            self.chunks_until_probe = self.reprobe_chunks
+            return None
+
+    def update(self, language, info, segments):
+        """
+        Record the outcome of a decode.
+
+        Args:
+            language (str): The language passed to the model, None if it detected the language.
+            info (TranscriptionInfo): Detected language and its probability.
+            segments (list): The decoded segments.
+        """
+        if self.fixed:
+            return
+        with self.lock:
+            if language is not None:
+                if segments and np.mean([s.avg_logprob for s in segments]) < LANGUAGE_MIN_LOGPROB:
+                    self.chunks_until_probe = min(self.chunks_until_probe, 1)  # Check the language next
+                return
+            metrics.count("language_detections")
+            if info.language_probability < self.min_probability:
+                if self.pinned is None:
+                    self.streak = 0
+                return
+            if info.language == self.candidate:
+                self.streak += 1
+            else:
+                self.candidate, self.streak = info.language, 1
+            if self.pinned is not None and info.language != self.pinned:
+                print(f"Detected {info.language} ({info.language_probability:.2f}) instead of "
+                      f"{self.pinned}, detecting the language again", flush=True)
+                self.pinned = None
+            if self.pinned is None and self.streak >= self.pin_after:
+                self.pinned = info.language
+                self.chunks_until_probe = self.reprobe_chunks
+                print(f"Language pinned to {self.pinned}", flush=True)
+
+# Skips per-chunk language detection once the language is known
+languages = LanguageTracker(LANGUAGE, LANGUAGE_PIN_AFTER, LANGUAGE_MIN_PROBABILITY, LANGUAGE_REPROBE_CHUNKS)
+
+def initialize_model(device, model_size=None):
     """
     Initialize the WhisperModel with the specified device.
 
     Args:
         device (str): The device to use ('cuda' or 'cpu').
+        model_size (str): Model size to load. Defaults to the configured model.
 
     Returns:
-        WhisperModel: The initialized model.
+        WhisperModel: The initialized model, or a ReplicaPool of CPU_REPLICAS replicas on CPU.
     """
-    print(f"Loading model: {MODEL_SIZE} on {device}", flush=True)
-    model = WhisperModel(MODEL_SIZE, device=device)
+    model_size = model_size or MODEL_SIZE
+    if device == "cpu" and CPU_REPLICAS > 1:
+        # The replicas load and warm up in their own processes
+        print(f"Loading model: {model_size} on {device} in {CPU_REPLICAS} processes", flush=True)
+        model = ReplicaPool(model_size, CPU_REPLICAS, CPU_THREADS, CHUNK_TIMEOUT, WARM_UP_MODEL)
+        print("Model loaded.", flush=True)
+        return model
+
+    # Imported here so the controller can open the audio device and the GUI while faster_whisper
+    # and CTranslate2 load
+    from faster_whisper import WhisperModel
+
+    print(f"Loading model: {model_size} on {device}", flush=True)
+    model = WhisperModel(model_size, device=device, cpu_threads=CPU_THREADS)
     print("Model loaded.", flush=True)
+    if WARM_UP_MODEL:
+        warm_up_model(model)
     return model
 
-def transcribe_audio(model, audio_path):
-    """
-    Transcribe the given audio file using the preloaded Faster Whisper model.
-    """
-    print(f"Starting transcription for {audio_path}...", flush=True)
+def warm_up_model(model):
+    """Run a short dummy decode so the first real chunk doesn't pay for lazy initialization."""
+    start = time.time()
     try:
-        with sf.SoundFile(audio_path) as sound_file:
-            if sound_file.frames == 0:
-                print(f"Warning: Empty audio file: {audio_path}")
-                return ""
+        segments, _ = model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), beam_size=1, language="en")
+        list(segments)  # Segments are generated lazily
+        print(f"Model warmed up in {time.time() - start:.2f} s.", flush=True)
     except Exception as e:
-        print(f"Error reading audio file {audio_path}: {e}")
-        return ""
+        print(f"Model warm-up failed: {e}", flush=True)
+
+def free_memory_mb(device):
+    """Return free memory in MB on the device, or None if it can't be determined."""
+    if device != "cuda":
+        return psutil.virtual_memory().available / 2**20
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=memory.free", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=5,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+        )
+        return float(result.stdout.split()[0])
+    except Exception:
+        return None
 
-    segments, _ = model.transcribe(audio_path, beam_size=1, vad_filter=True, word_timestamps=True)
-    transcription = " ".join(segment.text for segment in segments)
+class ModelSlot:
+    """
+    Holds the model used for transcription and swaps in a different model size without downtime.
+
+    The new model is loaded in the background while the current one keeps serving. Chunks pick
+    up the model when they start, so the swap takes effect between chunks, and the old model is
+    freed once the chunks still using it finish.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+        self.model_size = None
+        self.device = None
+        self.loading = None  # Model size currently being loaded in the background
+        self.batched = None
+        self.factory = initialize_model  # Called as factory(device, model_size), e.g. replaced by benchmarks
+
+    def load(self, device, model_size=None):
+        """Load the initial model."""
+        self.device = device
+        self.model_size = model_size or MODEL_SIZE
+        self.model = self.factory(device, self.model_size)
+        timeline.mark("model loaded")
+
+    def batched_model(self):
+        """Return a BatchedInferencePipeline around the current model."""
+        from faster_whisper import BatchedInferencePipeline
+
+        with self.lock:
+            if self.batched is None or self.batched.model is not self.model:
+                self.batched = BatchedInferencePipeline(model=self.model)
+            return self.batched
+
+    def swap(self, model_size):
+        """
+        Start loading another model size in the background.
+
+        Returns:
+            bool: False if the swap was refused.
+        """
+        with self.lock:
+            if model_size == self.model_size or model_size == self.loading:
+                return False
+            if self.loading:
+                print(f"Can't switch to {model_size}: still loading {self.loading}", flush=True)
+                return False
+            needed = MODEL_MEMORY_MB.get(model_size, MODEL_MEMORY_MB['large']) * SWAP_MEMORY_MARGIN
+            if isinstance(self.model, ReplicaPool):
+                needed *= len(self.model.replicas)
+            free = free_memory_mb(self.device)
+            if free is not None and free < needed:
+                print(f"Can't switch to {model_size} while {self.model_size} is loaded: "
+                      f"needs about {needed:.0f} MB, {free:.0f} MB free on {self.device}", flush=True)
+                return False
+            self.loading = model_size
+        threading.Thread(target=self._load_and_swap, args=(model_size,), daemon=True).start()
+        return True
+
+    def _load_and_swap(self, model_size):
+        try:
+            new_model = self.factory(self.device, model_size)
+        except Exception as e:
+            print(f"Error loading model {model_size}, keeping {self.model_size}: {e}", flush=True)
+            events.emit("error", message=f"Can't load model {model_size}: {e}")
+            with self.lock:
+                self.loading = None
+            return
+        with self.lock:
+            old_model = self.model
+            self.model = new_model
+            self.model_size = model_size
+            self.batched = None
+            self.loading = None
+        del old_model
+        gc.collect()
+        print(f"Switched model to {model_size}.", flush=True)
+        events.emit("model_switched", model=model_size)
+
+# Model shared by all transcription workers
+models = ModelSlot()
+
+def transcribe_audio(model, audio, name=None, deadline=None):
+    """
+    Transcribe the given audio using the preloaded Faster Whisper model.
+
+    Args:
+        model (WhisperModel): The loaded model.
+        audio (str or np.ndarray): Path to an audio file, or 16 kHz mono float32 samples.
+        name (str): Label used in log messages. Defaults to the file path.
+        deadline (float): time.time() after which decoding stops with ChunkTimeout.
+
+    Returns:
+        ChunkTranscript: The text with segment and word timings.
+    """
+    name = name or audio
+    print(f"Starting transcription for {name}...", flush=True)
+    if isinstance(audio, str):
+        try:
+            with sf.SoundFile(audio) as sound_file:
+                if sound_file.frames == 0:
+                    print(f"Warning: Empty audio file: {audio}")
+                    return ChunkTranscript([])
+        except Exception as e:
+            print(f"Error reading audio file {audio}: {e}")
+            return ChunkTranscript([])
+    elif audio.size == 0:
+        print(f"Warning: Empty audio chunk: {name}")
+        return ChunkTranscript([])
+
+    language = languages.next_language()
+    segments, info = model.transcribe(audio, beam_size=1, vad_filter=True, word_timestamps=True,
+                                      language=language)
+    segments = list(check_deadline(segments, deadline, name))
+    languages.update(language, info, segments)
+    transcription = ChunkTranscript.from_segments(segments)
+    print("Transcription completed.", flush=True)
+    return transcription
+
+def check_deadline(segments, deadline, name):
+    """
+    Pass segments through, raising ChunkTimeout once the deadline has passed. Segments are
+    decoded lazily, so this stops the decode between segments.
+    """
+    for segment in segments:
+        yield segment
+        if deadline and time.time() > deadline:
+            raise ChunkTimeout(f"{name} passed the {CHUNK_TIMEOUT} s transcription deadline")
+
+def transcribe_batch(batched_model, chunks, deadline=None):
+    """
+    Transcribe several in-memory chunks with one batched model call.
+
+    The chunks are concatenated and the speech regions of each are passed as clips, so the
+    pipeline decodes them as separate batch entries. faster-whisper skips its VAD when given
+    clips, so the chunks are trimmed to speech here, as vad_filter does for single chunks.
+    Segments are then assigned back to chunks by their start time.
+
+    Args:
+        batched_model (BatchedInferencePipeline): Batched pipeline around the loaded model.
+        chunks (list): recorder.AudioChunk objects with non-empty audio.
+        deadline (float): time.time() after which decoding stops with ChunkTimeout.
+
+    Returns:
+        list: One ChunkTranscript per chunk.
+    """
+    from faster_whisper.vad import get_speech_timestamps
+    names = ", ".join(chunk.name for chunk in chunks)
+    print(f"Starting transcription for {names}...", flush=True)
+    # faster-whisper takes the clips as sample offsets into the concatenated audio
+    clips = []
+    chunk_starts = []
+    offset = 0
+    for chunk in chunks:
+        chunk_starts.append(offset / SAMPLE_RATE)
+        for speech in get_speech_timestamps(chunk.audio):
+            clips.append({"start": offset + speech["start"], "end": offset + speech["end"]})
+        offset += len(chunk.audio)
+    if not clips:
+        print("No speech in the batch.", flush=True)
+        return [ChunkTranscript([], chunk.start_time) for chunk in chunks]
+
+    # The batch shares one language, detected from its start when not pinned
+    language = languages.next_language()
+    segments, info = batched_model.transcribe(
+        np.concatenate([chunk.audio for chunk in chunks]),
+        beam_size=1,
+        word_timestamps=True,
+        clip_timestamps=clips,
+        batch_size=len(clips),
+        language=language
+    )
+    segments = list(check_deadline(segments, deadline, names))
+    languages.update(language, info, segments)
+    chunk_segments = [[] for _ in chunks]
+    for segment in segments:
+        index = next((i for i in reversed(range(len(chunk_starts))) if segment.start >= chunk_starts[i]), 0)
+        chunk_segments[index].append(segment)
     print("Transcription completed.", flush=True)
-    return transcription.strip()
+    return [ChunkTranscript.from_segments(segments, chunk_start, chunk.start_time)
+            for segments, chunk_start, chunk in zip(chunk_segments, chunk_starts, chunks)]
 
-def save_transcription(transcription, output_path):
+def save_transcription(transcription, output_path, late=False, seq=None, source=None):
     """
     Save the transcription text to a file and send it to the GUI.
     
     Args:
-        transcription (str): The transcribed text.
+        transcription (ChunkTranscript): The transcribed text and its timings.
         output_path (str): Path to the output transcription file.
+        late (bool): Whether the chunk finished after later chunks were already shown.
+        seq (int): Capture sequence number of the chunk, if known.
+        source (str): Label of the capture source, when captioning several at once.
     """
-    with open(output_path, "a") as f:
-        f.write(transcription + "\n")
+    writer_for(source).write(output_path, transcription, late)
     print(f"Transcription saved to {output_path}", flush=True)
+    metrics.mark(seq, "released")
+    events.emit("caption", seq=seq, text=transcription.text, late=late, source=source)
     # Send transcription to GUI queue
-    transcription_queue.put(transcription)
+    transcription_queue.put(Caption(transcription.text, late=late, seq=seq, source=source))
+
+def create_reorder_buffer(output_path, source=None):
+    """Create a ReorderBuffer that saves results in capture order."""
+    return ReorderBuffer(
+        lambda seq, transcription, late: save_transcription(transcription, output_path, late, seq, source),
+        deadline=REORDER_DEADLINE,
+        late_policy=LATE_CAPTIONS
+    )
+
+def discard_backlog(audio_queue):
+    """Drop chunks captured while the model was loading, which would only delay the first live caption."""
+    discarded = audio_queue.clear()
+    if discarded:
+        print(f"Discarded {discarded} chunks captured while the model was loading", flush=True)
 
-def monitor_audio_file(input_dir, output_path, check_interval=0.5, device="cuda"):
+def create_worker_pool(cancel, chunk_length=None):
+    """
+    Create a WorkerPool that calls cancel(seq) for abandoned chunks, to skip them in the reorder buffer.
+    chunk_length, if given, is told how many chunks the model decodes at once.
+    """
+    def abandon(seq):
+        cancel(seq)
+        metrics.finish(seq, "timed_out")
+        events.emit("chunk_finished", seq=seq, outcome="timed_out", decode_seconds=CHUNK_TIMEOUT + ABANDON_GRACE)
+    if chunk_length:
+        chunk_length.set_workers(decode_parallelism())
+    return WorkerPool(worker_count(), CHUNK_TIMEOUT + ABANDON_GRACE, breaker, on_timeout=abandon)
+
+def decode_parallelism():
+    """
+    Number of chunks the model really decodes at once: one per replica, otherwise one, since
+    the WhisperModel is built with a single CTranslate2 worker and the transcription workers
+    take turns on it.
+    """
+    if isinstance(models.model, ReplicaPool):
+        return len(models.model.replicas)
+    return 1
+
+def worker_count():
+    """
+    Number of chunks to decode at once: one per model replica when using replicas. More workers
+    would wait for a busy replica, and that wait would count against the chunk's deadline while
+    the replica's own timeout only starts once the chunk is sent.
+    """
+    if isinstance(models.model, ReplicaPool):
+        return len(models.model.replicas)
+    return TRANSCRIPTION_WORKERS
+
+def monitor_audio_file(input_dir, output_path, check_interval=0.5, device="cuda", chunk_length=None):
     """
     Continuously monitor the directory for new audio files and transcribe them.
     
@@ -76,26 +502,402 @@ def monitor_audio_file(input_dir, output_path, check_interval=0.5, device="cuda"
         output_path (str): Path to save the transcriptions.
         check_interval (int): Time in seconds between checks.
         device (str): Device to use for transcription ('cuda' or 'cpu').
+        chunk_length (ChunkLengthController): Receives decode timings to adapt the recorder's chunk length.
     """
     processed_files = set()
-    model = initialize_model(device)
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)  # Allows parallel processing
+    models.load(device)
+    # Files can't be merged without decoding them, so 'coalesce' falls back to dropping the oldest
+    pending = WorkQueue(QUEUE_SIZE, QUEUE_POLICY, on_shed=metrics.shed)
+    reorder = create_reorder_buffer(output_path)
+    workers = create_worker_pool(reorder.cancel, chunk_length)  # Only hand out work when a worker is free
+    seq = 0
     while True:
-        for filename in os.listdir(input_dir):
+        # Recording names contain the capture timestamp, so sorting gives capture order
+        for filename in sorted(os.listdir(input_dir)):
             file_path = os.path.join(input_dir, filename)
             if file_path not in processed_files:
-                executor.submit(transcribe_and_save, model, file_path, output_path)
+                # Use the recorder's sequence number from the name, so the chunk keeps its trace
+                match = RECORDING_NAME.match(filename)
+                if match:
+                    seq = int(match.group(1))
+                metrics.mark(seq, "discovered")
+                metrics.mark(seq, "queued")
+                pending.put(AudioFile(file_path, seq))
                 processed_files.add(file_path)
+                seq += 1
+        while workers.acquire(timeout=0):
+            try:
+                audio_file = pending.get_nowait()
+            except queue.Empty:
+                workers.release()
+                break
+            metrics.mark(audio_file.seq, "dequeued")
+            reorder.register(audio_file.seq)
+            workers.submit(audio_file.seq, transcribe_and_save, models.model, audio_file.path, output_path, None,
+                           audio_file.seq, reorder, chunk_length, audio_file.capture_time)
+        workers.expire_overdue()
+        reorder.expire_overdue()
+        pending.report()
         time.sleep(check_interval)
 
-def transcribe_and_save(model, file_path, output_path):
+# Names written by the recorder: recording_<capture timestamp>_<sequence number>.wav
+RECORDING_NAME = re.compile(r"recording_\d+_(\d+)\.wav$")
+
+class AudioFile:
+    """A recording file waiting for transcription."""
+    def __init__(self, path, seq):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.seq = seq
+        self.capture_time = os.path.getmtime(path)
+
+def monitor_audio_queue(audio_queue, output_path, device="cuda", chunk_length=None):
+    """
+    Continuously take in-memory audio chunks from the recorder and transcribe them.
+
+    Args:
+        audio_queue (WorkQueue): Queue of recorder.AudioChunk objects.
+        output_path (str): Path to save the transcriptions.
+        device (str): Device to use for transcription ('cuda' or 'cpu').
+        chunk_length (ChunkLengthController): Receives decode timings to adapt the recorder's chunk length.
+    """
+    models.load(device)
+    discard_backlog(audio_queue)
+    reorder = create_reorder_buffer(output_path)
+    if BATCHED_INFERENCE and isinstance(models.model, ReplicaPool):
+        print("Batched inference isn't used with CPU model replicas", flush=True)
+    elif BATCHED_INFERENCE:
+        transcribe_batches(models, audio_queue, reorder, chunk_length)
+        return
+
+    # Only take chunks off the audio queue when a worker is free, so the backlog stays in the
+    # queue where its load-shedding policy applies
+    workers = create_worker_pool(reorder.cancel, chunk_length)
+    while True:
+        workers.expire_overdue()
+        reorder.expire_overdue()
+        audio_queue.report()
+        if not workers.acquire(timeout=0.2):
+            continue
+        try:
+            chunk = audio_queue.get(timeout=0.2)
+        except queue.Empty:
+            workers.release()
+            continue
+        metrics.mark(chunk.seq, "dequeued")
+        reorder.register(chunk.seq)
+        workers.submit(chunk.seq, transcribe_and_save, models.model, chunk.audio, output_path, chunk.name, chunk.seq,
+                       reorder, chunk_length, chunk.capture_time)
+
+def monitor_sources(source_queues, output_path, device="cuda", chunk_length=None, latency_targets=None):
+    """
+    Transcribe chunks from several capture sources at once with one model.
+
+    Each source keeps its own queue, reorder buffer, transcript file and caption lane. A
+    FairScheduler picks which source's chunk the next free worker decodes.
+
+    Args:
+        source_queues (dict): Source label -> WorkQueue of recorder.AudioChunk objects.
+        output_path (str): Transcript path; each source's label is appended to it.
+        device (str): Device to use for transcription ('cuda' or 'cpu').
+        chunk_length (ChunkLengthController): Receives decode timings to adapt the recorder's chunk length.
+        latency_targets (dict): Source label -> latency target in seconds. Defaults to SOURCE_LATENCY_TARGET.
+    """
+    models.load(device)
+    if BATCHED_INFERENCE:
+        print("Batched inference isn't used when captioning several sources", flush=True)
+    scheduler = FairScheduler(worker_count())
+    reorders = {}
+    for source, audio_queue in source_queues.items():
+        discard_backlog(audio_queue)
+        scheduler.add(source, audio_queue, (latency_targets or {}).get(source, SOURCE_LATENCY_TARGET))
+        reorders[source] = create_reorder_buffer(source_output_path(output_path, source), source)
+
+    def cancel(seq):
+        source = scheduler.finished(seq)
+        if source is not None:
+            reorders[source].cancel(seq)
+
+    def transcribe_chunk(model, source, chunk):
+        try:
+            # WorkerPool counts a False result as a failure for the circuit breaker
+            return transcribe_and_save(model, chunk.audio, source_output_path(output_path, source), chunk.name,
+                                       chunk.seq, reorders[source], chunk_length, chunk.capture_time)
+        finally:
+            scheduler.finished(chunk.seq)
+
+    workers = create_worker_pool(cancel, chunk_length)
+    while True:
+        workers.expire_overdue()
+        for source, reorder in reorders.items():
+            reorder.expire_overdue()
+            source_queues[source].report()
+        if not workers.acquire(timeout=0.2):
+            continue
+        try:
+            source, chunk = scheduler.get(timeout=0.2)
+        except queue.Empty:
+            workers.release()
+            continue
+        metrics.mark(chunk.seq, "dequeued")
+        reorders[source].register(chunk.seq)
+        scheduler.started(source, chunk.seq)
+        workers.submit(chunk.seq, transcribe_chunk, models.model, source, chunk)
+
+class StreamingTranscriber:
+    """
+    Re-decode a sliding window of audio and commit the words that two consecutive
+    hypotheses agree on.
+
+    Committed words are written to the output file and sent to the GUI as permanent
+    captions; the rest of the latest hypothesis is sent as a tentative tail that the
+    next update may revise.
+    """
+    def __init__(self, model, output_path, max_window=STREAM_MAX_WINDOW):
+        self.model = model
+        self.output_path = output_path
+        self.max_window = max_window
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_offset = 0.0  # Stream time in seconds of buffer[0]
+        self.committed_end = 0.0  # Stream time in seconds where the last committed word ends
+        self.committed_text = ""
+        self.hypothesis = []  # Uncommitted words of the previous decode as (start, end, word)
+        self.stream_origin = time.time()  # Wall-clock time of stream time 0 in the current window
+
+    def process(self, audio, name, capture_time=None):
+        """Append new audio to the window, re-decode it and publish the result."""
+        if len(self.buffer) == 0:
+            # Anchor stream time to the wall clock for transcript timestamps
+            self.stream_origin = (capture_time or time.time()) - len(audio) / SAMPLE_RATE - self.buffer_offset
+        self.buffer = np.concatenate([self.buffer, audio])
+        words = self.decode(name)
+
+        # Only words past the committed point are candidates
+        words = [w for w in words if w[0] >= self.committed_end - 0.05]
+        agreed = 0
+        for current, previous in zip(words, self.hypothesis):
+            if normalize_word(current[2]) != normalize_word(previous[2]):
+                break
+            agreed += 1
+
+        if agreed:
+            self.commit(words[:agreed])
+        self.hypothesis = words[agreed:]
+
+        if len(self.buffer) / SAMPLE_RATE > self.max_window:
+            if not words:
+                # Only silence in the window; keep the last second in case speech is starting
+                self.trim(self.buffer_offset + len(self.buffer) / SAMPLE_RATE - 1.0)
+            else:
+                if self.hypothesis and self.committed_end <= self.buffer_offset:
+                    # Nothing agreed on for a whole window, so accept what we have
+                    self.commit(self.hypothesis)
+                    self.hypothesis = []
+                self.trim(self.committed_end)
+
+        transcription_queue.put(Caption("".join(w[2] for w in self.hypothesis).strip(), tentative=True))
+
+    def decode(self, name):
+        """Decode the current window and return its words in stream time."""
+        print(f"Starting transcription for {name}...", flush=True)
+        deadline = time.time() + CHUNK_TIMEOUT
+        language = languages.next_language()
+        segments, info = self.model.transcribe(
+            self.buffer,
+            beam_size=1,
+            vad_filter=True,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=self.committed_text[-STREAM_PROMPT_CHARS:] or None,
+            language=language
+        )
+        segments = list(check_deadline(segments, deadline, name))
+        languages.update(language, info, segments)
+        words = [
+            (self.buffer_offset + word.start, self.buffer_offset + word.end, word.word)
+            for segment in segments
+            for word in (segment.words or [])
+        ]
+        print("Transcription completed.", flush=True)
+        return words
+
+    def commit(self, words):
+        """Publish words as permanent captions."""
+        text = "".join(w[2] for w in words).strip()
+        self.committed_end = words[-1][1]
+        self.committed_text = (self.committed_text + " " + text)[-STREAM_PROMPT_CHARS:]
+        end_of_line = text.endswith((".", "?", "!"))
+        transcript = ChunkTranscript([{
+            'start': words[0][0],
+            'end': words[-1][1],
+            'text': text,
+            'words': [{'start': start, 'end': end, 'word': word} for start, end, word in words],
+        }], self.stream_origin)
+        transcript_writer.write(self.output_path, transcript, end_of_line=end_of_line)
+        events.emit("caption", seq=None, text=text, late=False)
+        transcription_queue.put(Caption(text, end_of_line=end_of_line))
+
+    def flush(self):
+        """Commit the tentative tail and start a fresh window, e.g. after a gap in the audio."""
+        if self.hypothesis:
+            self.commit(self.hypothesis)
+            self.hypothesis = []
+            transcription_queue.put(Caption("", tentative=True))
+        self.trim(self.buffer_offset + len(self.buffer) / SAMPLE_RATE)
+
+    def trim(self, stream_time):
+        """Drop buffered audio before the given stream time."""
+        cut = int((stream_time - self.buffer_offset) * SAMPLE_RATE)
+        if cut > 0:
+            self.buffer = self.buffer[cut:]
+            self.buffer_offset += cut / SAMPLE_RATE
+
+def normalize_word(word):
+    """Normalize a word for comparing hypotheses."""
+    return word.strip().lower().strip(".,!?;:\"'")
+
+def monitor_audio_stream(audio_queue, output_path, device="cuda"):
+    """
+    Transcribe short in-memory audio blocks from the recorder with a sliding window.
+
+    Args:
+        audio_queue (WorkQueue): Queue of recorder.AudioChunk objects.
+        output_path (str): Path to save the transcriptions.
+        device (str): Device to use for transcription ('cuda' or 'cpu').
+    """
+    models.load(device)
+    discard_backlog(audio_queue)
+    streamer = StreamingTranscriber(models.model, output_path)
+    last_capture_time = None
+    while True:
+        audio_queue.report()
+        chunks = [audio_queue.get()]
+        if last_capture_time and chunks[0].start_time - last_capture_time > STREAM_MAX_GAP:
+            streamer.flush()
+        # Catch up on any blocks that arrived during the previous decode
+        while True:
+            try:
+                chunks.append(audio_queue.get_nowait())
+            except queue.Empty:
+                break
+        last_capture_time = chunks[-1].capture_time
+        streamer.model = models.model  # Pick up a hot-swapped model
+        start = time.time()
+        outcome = "streamed"
+        events.emit("chunk_started", seq=chunks[-1].seq, name=chunks[-1].name)
+        try:
+            streamer.process(np.concatenate([c.audio for c in chunks]), chunks[-1].name, chunks[-1].capture_time)
+        except Exception as e:
+            print(f"Can't transcribe audio chunk {chunks[-1].name}: {e}", flush=True)
+            events.emit("error", message=f"Can't transcribe audio chunk {chunks[-1].name}: {e}")
+            breaker.record_failure(str(e))
+            outcome = "failed"
+        end = time.time()
+        events.emit("chunk_finished", seq=chunks[-1].seq, outcome=outcome, decode_seconds=round(end - start, 3))
+        if outcome == "streamed":
+            breaker.record_success()
+            metrics.count("chunks_processed", len(chunks))
+        for chunk in chunks:
+            metrics.mark(chunk.seq, "dequeued", start)
+            metrics.mark(chunk.seq, "decode_start", start)
+            metrics.mark(chunk.seq, "decode_end", end)
+            metrics.finish(chunk.seq, outcome)
+
+def transcribe_batches(models, audio_queue, reorder, chunk_length=None):
+    """
+    Transcribe in-memory chunks in batches. Chunks that queue up while a batch is being
+    decoded all go into the next batch, so a backlog is worked off in few model calls.
+
+    Args:
+        models (ModelSlot): Holder of the loaded model.
+        audio_queue (WorkQueue): Queue of recorder.AudioChunk objects.
+        reorder (ReorderBuffer): Buffer that saves results in capture order.
+        chunk_length (ChunkLengthController): Receives decode timings to adapt the recorder's chunk length.
+    """
+    scheduler = BatchScheduler(MAX_BATCH_SIZE, BATCH_MAX_WAIT)
+    while True:
+        chunks = scheduler.next_batch(audio_queue)
+        for chunk in chunks:
+            metrics.mark(chunk.seq, "dequeued")
+            reorder.register(chunk.seq)
+        for chunk in [c for c in chunks if c.audio.size == 0]:
+            metrics.finish(chunk.seq, "empty")
+            reorder.complete(chunk.seq, "")
+        chunks = [c for c in chunks if c.audio.size > 0]
+        if chunks:
+            for chunk in chunks:
+                events.emit("chunk_started", seq=chunk.seq, name=chunk.name)
+            start = time.time()
+            try:
+                # The batch entries are decoded side by side, so the batch gets one chunk's deadline
+                transcriptions = transcribe_batch(models.batched_model(), chunks, start + CHUNK_TIMEOUT)
+                if chunk_length:
+                    chunk_length.record(time.time() - start)
+                breaker.record_success()
+                failed = False
+            except Exception as e:
+                print(f"Can't transcribe audio chunks {', '.join(c.name for c in chunks)}: {e}", flush=True)
+                events.emit("error", message=f"Can't transcribe audio chunks {', '.join(c.name for c in chunks)}: {e}")
+                transcriptions = [ChunkTranscript([])] * len(chunks)
+                breaker.record_failure(str(e))
+                failed = True
+            end = time.time()
+            for chunk, transcription in zip(chunks, transcriptions):
+                record_decode(chunk.seq, start, end, transcription, failed)
+                reorder.complete(chunk.seq, transcription)
+        reorder.expire_overdue()
+        audio_queue.report()
+
+def transcribe_and_save(model, audio, output_path, name=None, seq=None, reorder=None, chunk_length=None,
+                        capture_time=None):
+    """
+    Transcribe one chunk and save the result, through the reorder buffer if one is given.
+    Decode timings are reported to chunk_length if one is given. Decoding stops with an error
+    once it has taken CHUNK_TIMEOUT seconds. capture_time, when the chunk's audio ended, is
+    used to time the chunk in the transcript.
+
+    Returns:
+        bool: False if the chunk failed or timed out.
+    """
+    name = name or audio
+    transcription = ChunkTranscript([])
+    failed = False
+    events.emit("chunk_started", seq=seq, name=os.path.basename(name))
+    start = time.time()
     try:
-        print(f"Transcribing {file_path}...", flush=True)
-        transcription = transcribe_audio(model, file_path)
-        if transcription:
-            save_transcription(transcription, output_path)
+        print(f"Transcribing {name}...", flush=True)
+        transcription = transcribe_audio(model, audio, name, start + CHUNK_TIMEOUT)
+        if chunk_length:
+            chunk_length.record(time.time() - start)
+        if capture_time:
+            duration = sf.info(audio).duration if isinstance(audio, str) else len(audio) / SAMPLE_RATE
+            transcription.start_time = capture_time - duration
     except Exception as e:
-        print(f"Can't transcribe audio chunk {file_path}: {e}", flush=True)
+        print(f"Can't transcribe audio chunk {name}: {e}", flush=True)
+        events.emit("error", message=f"Can't transcribe audio chunk {name}: {e}")
+        failed = True
+    record_decode(seq, start, time.time(), transcription, failed)
+    if reorder is not None:
+        reorder.complete(seq, transcription)
+    elif transcription:
+        save_transcription(transcription, output_path)
+    return not failed
+
+def record_decode(seq, start, end, transcription, failed):
+    """
+    Record a chunk's decode in its trace, ending the trace if there is nothing to show,
+    and tell the launcher the chunk has finished.
+    """
+    metrics.mark(seq, "decode_start", start)
+    metrics.mark(seq, "decode_end", end)
+    outcome = "failed" if failed else "transcribed" if transcription else "empty"
+    events.emit("chunk_finished", seq=seq, outcome=outcome, decode_seconds=round(end - start, 3))
+    if failed:
+        metrics.finish(seq, "failed")
+        return
+    metrics.count("chunks_processed")
+    if not transcription:
+        metrics.finish(seq, "empty")
 
 if __name__ == "__main__":
     monitor_audio_file(AUDIO_INPUT_DIR, TRANSCRIPTION_OUTPUT)
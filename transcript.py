@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+
+FORMATS = ("txt", "srt", "vtt", "jsonl")
+FLUSH_INTERVAL = 1.0  # Seconds between flushes of buffered captions to the file
+FSYNC_INTERVAL = 5.0  # Seconds between fsyncs, so a crash loses at most this much
+
+class ChunkTranscript:
+    """
+    Transcription of one chunk: its segments, with times in seconds from the start of the chunk.
+
+    Segments are dicts with 'start', 'end', 'text' and 'words', a list of dicts with 'start',
+    'end' and 'word'. start_time is the wall-clock time the chunk's audio started, if known.
+    Empty transcripts are false, like an empty string.
+    """
+    def __init__(self, segments, start_time=None):
+        self.segments = segments
+        self.start_time = start_time
+
+    @classmethod
+    def from_segments(cls, segments, offset=0.0, start_time=None):
+        """Build a transcript from faster-whisper segments, shifting their times back by offset."""
+        return cls([{
+            'start': segment.start - offset,
+            'end': segment.end - offset,
+            'text': segment.text.strip(),
+            'words': [{'start': word.start - offset, 'end': word.end - offset, 'word': word.word}
+                      for word in (segment.words or [])],
+        } for segment in segments], start_time)
+
+    @property
+    def text(self):
+        return " ".join(segment['text'] for segment in self.segments if segment['text']).strip()
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def __str__(self):
+        return self.text
+
+class TranscriptWriter:
+    """
+    Write captions to the transcript file as plain text, SRT, WebVTT or JSON lines.
+
+    The file stays open for the whole session. Writes are buffered, flushed every FLUSH_INTERVAL
+    and fsynced every FSYNC_INTERVAL seconds by a background thread. Subtitle timestamps are
+    relative to the start of the session. Plain text goes to the given path, the other formats
+    to the same path with the format as extension.
+    """
+    def __init__(self, format="txt"):
+        if format not in FORMATS:
+            print(f"Unknown transcript format '{format}', using txt", flush=True)
+            format = "txt"
+        self.format = format
+        self.lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.session_start = time.time()
+        self.cues = 0
+        self.dirty = False
+        self.last_fsync = time.time()
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+
+    def output_path(self, path):
+        """Return the file the transcript for path is written to."""
+        if self.format == "txt":
+            return path
+        return os.path.splitext(path)[0] + "." + self.format
+
+    def start_session(self, path=None):
+        """Start a new transcript, truncating the file and restarting timestamps from zero."""
+        with self.lock:
+            path = path or self.path
+            if path is None:
+                return
+            self._open(path, "w")
+            self.session_start = time.time()
+
+    def write(self, path, transcript, late=False, end_of_line=True):
+        """
+        Add a caption to the transcript.
+
+        Args:
+            path (str): Transcript path, as passed to the transcriber.
+            transcript (ChunkTranscript): The caption and its timings.
+            late (bool): Whether the caption is shown after later ones.
+            end_of_line (bool): Whether the caption ends a line, in plain text.
+        """
+        with self.lock:
+            if self.file is None or path != self.path:
+                self._open(path, "a")
+            offset = (transcript.start_time or time.time()) - self.session_start
+            if self.format == "txt":
+                self.file.write(transcript.text + ("\n" if end_of_line else " "))
+            elif self.format == "jsonl":
+                for segment in transcript.segments:
+                    self.file.write(json.dumps({
+                        'start': round(offset + segment['start'], 3),
+                        'end': round(offset + segment['end'], 3),
+                        'text': segment['text'],
+                        'late': late,
+                        'words': [{'start': round(offset + w['start'], 3), 'end': round(offset + w['end'], 3),
+                                   'word': w['word']} for w in segment['words']],
+                    }) + "\n")
+            else:
+                for segment in transcript.segments:
+                    self.cues += 1
+                    self.file.write(self._cue(segment, offset))
+            self.dirty = True
+
+    def _cue(self, segment, offset):
+        start = format_timestamp(offset + segment['start'], self.format)
+        end = format_timestamp(offset + segment['end'], self.format)
+        if self.format == "srt":
+            return f"{self.cues}\n{start} --> {end}\n{segment['text']}\n\n"
+        # WebVTT cue timestamps mark where each word starts, for karaoke-style rendering
+        text = "".join(word['word'] if i == 0 else
+                       f"<{format_timestamp(offset + word['start'], 'vtt')}>{word['word']}"
+                       for i, word in enumerate(segment['words'])).strip() or segment['text']
+        return f"{start} --> {end}\n{text}\n\n"
+
+    def _open(self, path, mode):
+        if self.file:
+            self.file.close()
+        self.path = path
+        self.file = open(self.output_path(path), mode, encoding="utf-8")
+        if self.format == "vtt" and self.file.tell() == 0:
+            self.file.write("WEBVTT\n\n")
+        self.cues = 0
+
+    def flush(self, fsync=False):
+        """Write buffered captions to the file, and to disk if fsync is set."""
+        with self.lock:
+            if self.file is None or not self.dirty:
+                return
+            self.file.flush()
+            if fsync:
+                os.fsync(self.file.fileno())
+                self.dirty = False
+                self.last_fsync = time.time()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush(fsync=time.time() - self.last_fsync >= FSYNC_INTERVAL)
+            except (OSError, ValueError) as e:
+                print(f"Error writing transcript: {e}", flush=True)
+
+def format_timestamp(seconds, format):
+    """Format seconds as an SRT (00:00:01,500) or WebVTT (00:00:01.500) timestamp."""
+    milliseconds = max(0, round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    separator = "," if format == "srt" else "."
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"